@@ -3,19 +3,25 @@ QR-Asist - Servidor Flask
 Rutas y endpoints de la aplicación
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, g, Response, stream_with_context
 import os
 import json
 from datetime import datetime
 import csv
+import threading
+import time
 
 # Importar módulos del proyecto
-from modules.generador_qr import GeneradorQR
+# (el generador se importa al primer uso: qrcode, PIL y ReportLab son lentos
+# de cargar y una laptop de entrada solo necesita el lector)
 from modules.lector_qr import LectorQR
+from modules.metricas import metricas
+from modules.descarga_zip import carpetas_grupo, generar_zip
 import config
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'qr-asist-secret-key-2026'
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_TAMANO_PETICION
 
 # Configuración de rutas
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -30,9 +36,58 @@ os.makedirs(REGISTROS_DIR, exist_ok=True)
 os.makedirs(REPORTES_DIR, exist_ok=True)
 
 # Instanciar módulos
-generador = GeneradorQR()
+generador = None
+_bloqueo_generador = threading.Lock()
 lector = LectorQR(laptop_id=config.LAPTOP_ID)
 
+def obtener_generador():
+    """Crear el generador de QR la primera vez que se necesita"""
+    global generador
+    if generador is None:
+        with _bloqueo_generador:
+            if generador is None:
+                from modules.generador_qr import GeneradorQR
+                generador = GeneradorQR()
+    return generador
+
+# ==================== MÉTRICAS ====================
+
+@app.before_request
+def iniciar_medicion():
+    """Registrar el inicio de cada petición"""
+    g.inicio_peticion = time.perf_counter()
+    metricas.sumar('http_peticiones_en_curso', 1)
+
+@app.after_request
+def registrar_medicion(response):
+    """Registrar latencia y código de respuesta de cada petición"""
+    endpoint = request.endpoint or 'desconocido'
+    inicio = g.get('inicio_peticion')
+    if inicio is not None:
+        metricas.observar('http_peticion_segundos', time.perf_counter() - inicio, endpoint=endpoint)
+    metricas.incrementar('http_respuestas_total', endpoint=endpoint, codigo=response.status_code)
+    return response
+
+@app.teardown_request
+def finalizar_medicion(exc):
+    """Descontar la petición aunque haya terminado con error"""
+    if g.pop('inicio_peticion', None) is not None:
+        metricas.sumar('http_peticiones_en_curso', -1)
+
+def respuesta_error(e):
+    """Registrar una excepción inesperada y devolver la respuesta 500"""
+    app.logger.exception("Error en %s", request.path)
+    metricas.incrementar('errores_total', operacion=request.endpoint or 'desconocido', tipo=type(e).__name__)
+    return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(
+        metricas.exportar_prometheus(),
+        mimetype='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 # ==================== RUTAS DE PÁGINAS ====================
 
 @app.route('/')
@@ -94,7 +149,7 @@ def cargar_csv():
         })
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
 
 @app.route('/api/generar-qr', methods=['POST'])
 def generar_qr_api():
@@ -111,17 +166,18 @@ def generar_qr_api():
             return jsonify({'error': 'Faltan datos requeridos'}), 400
         
         # Generar QR para cada alumno
-        resultado = generador.generar_codigos_qr(
+        resultado = obtener_generador().generar_codigos_qr(
             alumnos=alumnos,
             nivel=nivel,
             grado=grado,
-            seccion=seccion
+            seccion=seccion,
+            carnet=bool(datos.get('carnet'))
         )
         
         return jsonify(resultado)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
 
 @app.route('/api/generar-pdf', methods=['POST'])
 def generar_pdf_api():
@@ -135,12 +191,16 @@ def generar_pdf_api():
         alumnos = datos.get('alumnos', [])
         
         # Generar PDF
-        pdf_path = generador.crear_pdf_impresion(
-            alumnos=alumnos,
-            nivel=nivel,
-            grado=grado,
-            seccion=seccion
-        )
+        try:
+            pdf_path = obtener_generador().crear_pdf_impresion(
+                alumnos=alumnos,
+                nivel=nivel,
+                grado=grado,
+                seccion=seccion,
+                diseno=datos.get('diseno')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if pdf_path and os.path.exists(pdf_path):
             return send_file(
@@ -152,7 +212,43 @@ def generar_pdf_api():
             return jsonify({'error': 'No se pudo generar el PDF'}), 500
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
+
+@app.route('/api/generar-pdf-colegio', methods=['POST'])
+def generar_pdf_colegio_api():
+    """Generar un solo PDF con todas las secciones (en paralelo)"""
+    try:
+        datos = request.json
+        grupos = datos.get('grupos', [])
+        
+        for grupo in grupos:
+            if not all([grupo.get('nivel'), grupo.get('grado'), grupo.get('seccion')]):
+                return jsonify({'error': 'Cada grupo necesita nivel, grado y sección'}), 400
+        
+        if not any(grupo.get('alumnos') for grupo in grupos):
+            return jsonify({'error': 'No se enviaron alumnos'}), 400
+        
+        try:
+            resultado = obtener_generador().crear_pdf_colegio(
+                grupos=grupos,
+                diseno=datos.get('diseno')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        respuesta = send_file(
+            resultado['ruta'],
+            as_attachment=True,
+            download_name=resultado['nombre']
+        )
+        # El PDF es temporal: se borra cuando termina de enviarse. Sin
+        # direct_passthrough Werkzeug no ejecuta call_on_close con send_file
+        respuesta.direct_passthrough = False
+        respuesta.call_on_close(lambda: os.remove(resultado['ruta']))
+        return respuesta
+    
+    except Exception as e:
+        return respuesta_error(e)
 
 @app.route('/api/agregar-alumno', methods=['POST'])
 def agregar_alumno_api():
@@ -172,17 +268,46 @@ def agregar_alumno_api():
         # Generar QR para este alumno
         alumno = {'id': id_alumno, 'nombre': nombre}
         
-        resultado = generador.generar_qr_individual(
+        resultado = obtener_generador().generar_qr_individual(
             alumno=alumno,
             nivel=nivel,
             grado=grado,
-            seccion=seccion
+            seccion=seccion,
+            carnet=bool(datos.get('carnet'))
         )
         
         return jsonify(resultado)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
+
+@app.route('/api/descargar-qr-zip', methods=['GET'])
+def descargar_qr_zip_api():
+    """Descargar en ZIP los QR de un grupo (o de todo el colegio sin filtros)"""
+    try:
+        nivel = request.args.get('nivel')
+        grado = request.args.get('grado')
+        seccion = request.args.get('seccion')
+        
+        filtros = [nivel, grado, seccion]
+        if any(filtros) and not all(filtros):
+            return jsonify({'error': 'Indica nivel, grado y sección, o ninguno para todo el colegio'}), 400
+        
+        carpetas = carpetas_grupo(QR_DIR, nivel, grado, seccion)
+        if not carpetas:
+            return jsonify({'error': 'No hay códigos QR generados para ese grupo'}), 404
+        
+        nombre_zip = f"QR_{nivel}_{grado}_{seccion}.zip" if nivel else "QR_colegio.zip"
+        
+        # Se envía por bloques (chunked) a medida que se arma el ZIP
+        return Response(
+            stream_with_context(generar_zip(carpetas)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{nombre_zip}"'}
+        )
+    
+    except Exception as e:
+        return respuesta_error(e)
 
 # ==================== API MÓDULO 2: LECTOR QR ====================
 
@@ -200,7 +325,7 @@ def registrar_asistencia_api():
         return jsonify(resultado)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
 
 @app.route('/api/estadisticas-hoy', methods=['GET'])
 def estadisticas_hoy_api():
@@ -216,22 +341,24 @@ def estadisticas_hoy_api():
         })
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
 
 @app.route('/api/listar-archivos', methods=['GET'])
 def listar_archivos_api():
-    """Listar archivos de registro disponibles"""
+    """Listar archivos de registro disponibles (?archivados=1 incluye los días archivados)"""
     try:
-        archivos = lector.listar_archivos_registro()
+        incluir_archivados = request.args.get('archivados', '').lower() in ('1', 'true', 'si')
+        archivos = lector.listar_archivos_registro(incluir_archivados)
         
         return jsonify({
             'success': True,
             'archivos': archivos,
-            'total': len(archivos)
+            'total': len(archivos),
+            'meses_archivados': lector.obtener_archivador().resumen()
         })
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
 
 @app.route('/api/enviar-archivos', methods=['POST'])
 def enviar_archivos_api():
@@ -252,7 +379,32 @@ def enviar_archivos_api():
         return jsonify(resultado)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return respuesta_error(e)
+
+@app.route('/api/archivar-registros', methods=['POST'])
+def archivar_registros_api():
+    """Compactar registros enviados de días cerrados en archivos mensuales"""
+    try:
+        resultado = lector.archivar_registros(config.DIAS_ANTES_DE_ARCHIVAR)
+        return jsonify(resultado)
+    
+    except Exception as e:
+        return respuesta_error(e)
+
+@app.route('/api/registros-alumno/<id_alumno>', methods=['GET'])
+def registros_alumno_api(id_alumno):
+    """Historial de asistencias de un alumno (incluye días archivados)"""
+    try:
+        registros = lector.registros_alumno(id_alumno)
+        
+        return jsonify({
+            'success': True,
+            'registros': registros,
+            'total': len(registros)
+        })
+    
+    except Exception as e:
+        return respuesta_error(e)
 
 @app.route('/api/verificar-red', methods=['GET'])
 def verificar_red_api():
@@ -281,10 +433,15 @@ def page_not_found(e):
     """Página no encontrada"""
     return render_template('index.html'), 404
 
+@app.errorhandler(413)
+def request_too_large(e):
+    """Petición demasiado grande"""
+    return jsonify({'error': 'El archivo o la petición es demasiado grande'}), 413
+
 @app.errorhandler(500)
 def internal_error(e):
     """Error interno del servidor"""
     return jsonify({'error': 'Error interno del servidor'}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=config.FLASK_DEBUG, threaded=True)
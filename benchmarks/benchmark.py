@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+QR-Asist - Benchmarks de rendimiento
+Mide generación de QR/PDF, registro de asistencias, estadísticas,
+listado de archivos y endpoints Flask bajo carga concurrente.
+
+Uso:
+    python benchmarks/benchmark.py                    # tamaños completos
+    python benchmarks/benchmark.py --rapido           # solo tamaños pequeños
+    python benchmarks/benchmark.py --salida res.json  # guardar resultados
+
+Todo se ejecuta offline dentro de una carpeta temporal; los resultados
+se emiten en JSON para comparar versiones entre sí.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Agregar la raíz del proyecto al path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules.lector_qr import LectorQR
+
+CABECERA_REGISTRO = "ID,NOMBRE_COMPLETO,NIVEL,GRADO,SECCION,FECHA,HORA,LAPTOP\n"
+
+
+# ==================== UTILIDADES ====================
+
+def crear_alumnos(cantidad):
+    """Lista sintética de alumnos con nombres con tildes"""
+    return [
+        {'id': f"A{i:05d}", 'nombre': f"Alumno Pérez Núñez {i:05d}"}
+        for i in range(cantidad)
+    ]
+
+def resumir(tiempos):
+    """Resumen estadístico de una lista de tiempos (segundos)"""
+    ordenados = sorted(tiempos)
+
+    def percentil(p):
+        idx = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+        return ordenados[idx]
+
+    return {
+        'repeticiones': len(ordenados),
+        'min_s': ordenados[0],
+        'mediana_s': statistics.median(ordenados),
+        'media_s': statistics.fmean(ordenados),
+        'p95_s': percentil(95),
+        'p99_s': percentil(99),
+        'max_s': ordenados[-1]
+    }
+
+def medir(funcion, repeticiones=1, preparar=None):
+    """Ejecutar una función varias veces y devolver sus tiempos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def nuevo_lector(carpeta, laptop_id="BENCH"):
+    """LectorQR que escribe en una carpeta temporal"""
+    lector = LectorQR(laptop_id=laptop_id)
+    lector.registro_dir = carpeta
+    os.makedirs(carpeta, exist_ok=True)
+    return lector
+
+def escribir_log(ruta, lineas, laptop_id="BENCH", fecha="2026-01-18"):
+    """Crear un archivo de registro con N asistencias"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(CABECERA_REGISTRO)
+        for i in range(lineas):
+            f.write(f"A{i:05d},Alumno Pérez Núñez {i:05d},Primaria,5,A,{fecha},08:{(i // 60) % 60:02d}:{i % 60:02d},{laptop_id}\n")
+
+
+# ==================== BENCHMARKS ====================
+
+def bench_generacion(tmp, tamanos):
+    """GeneradorQR.generar_codigos_qr y crear_pdf_impresion"""
+    from modules.generador_qr import GeneradorQR
+
+    resultados = []
+    for n in tamanos:
+        alumnos = crear_alumnos(n)
+
+        generador = GeneradorQR()
+        generador.qr_dir = os.path.join(tmp, 'qr_codes')
+        tiempos = medir(lambda: generador.generar_codigos_qr(alumnos, 'Primaria', '5', 'A'))
+        resultados.append({
+            'nombre': 'generar_codigos_qr',
+            'alumnos': n,
+            **resumir(tiempos),
+            'por_alumno_ms': tiempos[0] / n * 1000
+        })
+
+        generador = GeneradorQR()
+        generador.qr_dir = os.path.join(tmp, 'qr_codes')
+        tiempos = medir(lambda: generador.crear_pdf_impresion(alumnos, 'Primaria', '5', 'A'))
+        resultados.append({
+            'nombre': 'crear_pdf_impresion',
+            'alumnos': n,
+            **resumir(tiempos),
+            'por_alumno_ms': tiempos[0] / n * 1000
+        })
+
+        shutil.rmtree(generador.qr_dir, ignore_errors=True)
+
+    return resultados
+
+def bench_registro(tmp, escaneos):
+    """LectorQR.registrar_asistencia con y sin duplicados"""
+    resultados = []
+
+    # Sin duplicados: todos los IDs son distintos
+    lector = nuevo_lector(os.path.join(tmp, 'registro_unicos'))
+    qrs = [f"A{i:05d}|Alumno {i}|Primaria|5|A" for i in range(escaneos)]
+    tiempos = []
+    for qr in qrs:
+        inicio = time.perf_counter()
+        lector.registrar_asistencia(qr)
+        tiempos.append(time.perf_counter() - inicio)
+    resultados.append({
+        'nombre': 'registrar_asistencia',
+        'escenario': 'sin_duplicados',
+        **resumir(tiempos),
+        'escaneos_por_s': len(tiempos) / sum(tiempos)
+    })
+
+    # Con duplicados: 50 alumnos escaneados una y otra vez
+    lector = nuevo_lector(os.path.join(tmp, 'registro_duplicados'))
+    qrs = [f"A{i % 50:05d}|Alumno {i % 50}|Primaria|5|A" for i in range(escaneos)]
+    tiempos = []
+    for qr in qrs:
+        inicio = time.perf_counter()
+        lector.registrar_asistencia(qr)
+        tiempos.append(time.perf_counter() - inicio)
+    resultados.append({
+        'nombre': 'registrar_asistencia',
+        'escenario': 'con_duplicados',
+        **resumir(tiempos),
+        'escaneos_por_s': len(tiempos) / sum(tiempos)
+    })
+
+    return resultados
+
+def bench_estadisticas(tmp, tamanos, repeticiones):
+    """contar_registros_hoy y obtener_ultimos_registros sobre logs crecientes"""
+    resultados = []
+    for n in tamanos:
+        lector = nuevo_lector(os.path.join(tmp, f'registro_estadisticas_{n}'))
+        escribir_log(lector.obtener_archivo_hoy(), n)
+
+        tiempos = medir(lector.contar_registros_hoy, repeticiones)
+        resultados.append({'nombre': 'contar_registros_hoy', 'lineas': n, **resumir(tiempos)})
+
+        tiempos = medir(lambda: lector.obtener_ultimos_registros(5), repeticiones)
+        resultados.append({'nombre': 'obtener_ultimos_registros', 'lineas': n, **resumir(tiempos)})
+
+    return resultados
+
+def bench_listado(tmp, tamanos, repeticiones, lineas_por_archivo=300):
+    """listar_archivos_registro con cientos de archivos históricos"""
+    resultados = []
+    for n in tamanos:
+        carpeta = os.path.join(tmp, f'registro_listado_{n}')
+        lector = nuevo_lector(carpeta)
+
+        # Un archivo por día escolar; la mitad ya enviados
+        for i in range(n):
+            fecha = datetime(2024, 1, 1).toordinal() + i
+            fecha_str = datetime.fromordinal(fecha).strftime("%Y%m%d")
+            ruta = os.path.join(carpeta, f"asistencia_BENCH_{fecha_str}.txt")
+            escribir_log(ruta, lineas_por_archivo)
+            if i % 2 == 0:
+                with open(ruta + '.enviado', 'w') as f:
+                    f.write("2026-01-18 17:00:00")
+
+        # En frío: sin índice guardado ni en memoria (primer listado tras
+        # instalar o borrar .indice_registro.json); en caliente: índice al día
+        def sin_indice():
+            lector.indice = None
+            ruta_indice = os.path.join(carpeta, '.indice_registro.json')
+            if os.path.exists(ruta_indice):
+                os.remove(ruta_indice)
+
+        for escenario, preparar in (('frio', sin_indice), ('caliente', None)):
+            tiempos = medir(lector.listar_archivos_registro, repeticiones, preparar)
+            resultados.append({
+                'nombre': 'listar_archivos_registro',
+                'escenario': escenario,
+                'archivos': n,
+                'lineas_por_archivo': lineas_por_archivo,
+                **resumir(tiempos)
+            })
+
+    return resultados
+
+def bench_endpoints(tmp, hilos, peticiones):
+    """Endpoints Flask bajo carga concurrente usando el cliente de pruebas"""
+    import app as aplicacion
+
+    aplicacion.lector = nuevo_lector(os.path.join(tmp, 'registro_flask'))
+    aplicacion.app.config['TESTING'] = True
+
+    def carga(nombre, peticion):
+        def trabajador(indices):
+            cliente = aplicacion.app.test_client()
+            tiempos = []
+            errores = 0
+            for i in indices:
+                inicio = time.perf_counter()
+                respuesta = peticion(cliente, i)
+                tiempos.append(time.perf_counter() - inicio)
+                if respuesta.status_code != 200:
+                    errores += 1
+            return tiempos, errores
+
+        bloques = [range(h, peticiones, hilos) for h in range(hilos)]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            parciales = list(pool.map(trabajador, bloques))
+        duracion = time.perf_counter() - inicio
+
+        tiempos = [t for parcial, _ in parciales for t in parcial]
+        return {
+            'nombre': nombre,
+            'hilos': hilos,
+            'peticiones': peticiones,
+            'errores': sum(e for _, e in parciales),
+            'peticiones_por_s': peticiones / duracion,
+            **resumir(tiempos)
+        }
+
+    return [
+        carga('POST /api/registrar-asistencia', lambda c, i: c.post(
+            '/api/registrar-asistencia',
+            json={'qr_data': f"F{i:05d}|Alumno {i}|Primaria|5|A"}
+        )),
+        carga('GET /api/estadisticas-hoy', lambda c, i: c.get('/api/estadisticas-hoy')),
+        carga('GET /api/listar-archivos', lambda c, i: c.get('/api/listar-archivos')),
+        carga('GET /metrics', lambda c, i: c.get('/metrics'))
+    ]
+
+
+# ==================== PRINCIPAL ====================
+
+def main():
+    """Ejecutar todos los benchmarks y emitir JSON"""
+    parser = argparse.ArgumentParser(description="Benchmarks de QR-Asist")
+    parser.add_argument('--rapido', action='store_true', help="usar solo tamaños pequeños")
+    parser.add_argument('--salida', help="archivo JSON de salida (por defecto, stdout)")
+    parser.add_argument('--hilos', type=int, default=8, help="hilos para la carga concurrente")
+    args = parser.parse_args()
+
+    if args.rapido:
+        tamanos_generacion = [40, 400]
+        escaneos = 2000
+        tamanos_log = [100, 1000, 10000]
+        tamanos_listado = [50, 200]
+        peticiones = 400
+        repeticiones = 5
+    else:
+        tamanos_generacion = [40, 400, 4000]
+        escaneos = 10000
+        tamanos_log = [100, 1000, 10000, 100000]
+        tamanos_listado = [100, 300, 600]
+        peticiones = 2000
+        repeticiones = 20
+
+    tmp = tempfile.mkdtemp(prefix='qrasist_bench_')
+    inicio = time.perf_counter()
+    try:
+        resultados = []
+        for grupo, funcion in [
+            ('generacion', lambda: bench_generacion(tmp, tamanos_generacion)),
+            ('registro', lambda: bench_registro(tmp, escaneos)),
+            ('estadisticas', lambda: bench_estadisticas(tmp, tamanos_log, repeticiones)),
+            ('listado', lambda: bench_listado(tmp, tamanos_listado, repeticiones)),
+            ('endpoints', lambda: bench_endpoints(tmp, args.hilos, peticiones))
+        ]:
+            print(f"⏱️  {grupo}...", file=sys.stderr)
+            for resultado in funcion():
+                resultados.append({'grupo': grupo, **resultado})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'modo': 'rapido' if args.rapido else 'completo',
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesadores': os.cpu_count(),
+        'duracion_total_s': time.perf_counter() - inicio,
+        'resultados': resultados
+    }
+
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + "\n")
+        print(f"✅ Resultados guardados en {args.salida}", file=sys.stderr)
+    else:
+        print(texto)
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,22 @@ QR_BORDER = 4  # Borde del QR
 HORA_INICIO_CLASES = "08:00:00"
 MINUTOS_TOLERANCIA_DUPLICADOS = 2
 
+# Archivo de registros antiguos
+# Los archivos ya enviados se compactan en registro/archivo/ (un segmento
+# comprimido por mes) cuando tienen al menos esta cantidad de días
+DIAS_ANTES_DE_ARCHIVAR = 7
+
 # Flask
 FLASK_SECRET_KEY = 'qr-asist-secret-key-2026'
 FLASK_DEBUG = False
-FLASK_PORT = 5000
\ No newline at end of file
+FLASK_PORT = 5000
+
+# Servidor (modo de ejecución)
+# "produccion" usa waitress (si está instalado) o el servidor WSGI con hilos
+# de Werkzeug; "desarrollo" usa el servidor de desarrollo de Flask.
+SERVIDOR_MODO = "produccion"
+SERVIDOR_HOST = "127.0.0.1"  # Usar "0.0.0.0" para aceptar otras máquinas de la red
+SERVIDOR_HILOS = 8  # Hilos de trabajo para atender peticiones concurrentes
+SERVIDOR_CONEXIONES_MAX = 100  # Conexiones simultáneas (waitress); en Werkzeug, cola de listen()
+SERVIDOR_KEEPALIVE = 120  # Segundos que se mantiene abierta una conexión inactiva
+MAX_TAMANO_PETICION = 16 * 1024 * 1024  # 16 MB (CSV de alumnos, JSON de QR)
@@ -4,21 +4,75 @@ QR-Asist - Sistema de Control de Asistencia Escolar
 Punto de entrada principal del programa
 """
 
+import time
+
+# Medir el tiempo de carga desde que empieza a ejecutarse este archivo
+# (no incluye el arranque del intérprete de Python, ~20-50 ms)
+INICIO_ARRANQUE = time.perf_counter()
+
 import webbrowser
 import threading
-import time
 import sys
 import os
 
 # Agregar el directorio actual al path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app
+from app import app, lector
+from modules.metricas import metricas
+import config
+
+TIEMPO_CARGA_MS = (time.perf_counter() - INICIO_ARRANQUE) * 1000
+metricas.fijar('arranque_carga_segundos', TIEMPO_CARGA_MS / 1000)
 
 def abrir_navegador():
     """Espera y abre el navegador automáticamente"""
     time.sleep(1.5)
-    webbrowser.open('http://127.0.0.1:5000')
+    webbrowser.open(f'http://127.0.0.1:{config.FLASK_PORT}')
+
+def iniciar_servidor_produccion():
+    """Iniciar servidor WSGI multihilo (waitress o Werkzeug con hilos)"""
+    try:
+        from waitress import serve
+    except ImportError:
+        serve = None
+    
+    if serve is not None:
+        print(f"⚙️  Servidor: waitress ({config.SERVIDOR_HILOS} hilos)")
+        serve(
+            app,
+            host=config.SERVIDOR_HOST,
+            port=config.FLASK_PORT,
+            threads=config.SERVIDOR_HILOS,
+            connection_limit=config.SERVIDOR_CONEXIONES_MAX,
+            channel_timeout=config.SERVIDOR_KEEPALIVE,
+            max_request_body_size=config.MAX_TAMANO_PETICION,
+            ident='QR-Asist'
+        )
+        return
+    
+    # Alternativa sin dependencias extra: servidor WSGI de Werkzeug con un
+    # hilo por petición y conexiones persistentes (HTTP/1.1 keep-alive)
+    from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+    
+    class ManejadorKeepAlive(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        timeout = config.SERVIDOR_KEEPALIVE
+    
+    class ServidorConHilos(ThreadedWSGIServer):
+        # Cola de conexiones pendientes de listen(); debe fijarse en la clase
+        # porque el constructor ya llama a listen(). Werkzeug no limita las
+        # conexiones simultáneas: ese límite solo lo aplica waitress
+        request_queue_size = config.SERVIDOR_CONEXIONES_MAX
+    
+    print("⚙️  Servidor: Werkzeug con hilos (instala waitress para mejor rendimiento)")
+    servidor = ServidorConHilos(
+        config.SERVIDOR_HOST,
+        config.FLASK_PORT,
+        app,
+        handler=ManejadorKeepAlive
+    )
+    servidor.serve_forever()
 
 def main():
     """Función principal"""
@@ -28,18 +82,33 @@ def main():
     print()
     print("🚀 Iniciando servidor local...")
     print("📱 El navegador se abrirá automáticamente")
-    print("🌐 URL: http://127.0.0.1:5000")
+    print(f"⏱️  Carga inicial: {TIEMPO_CARGA_MS:.0f} ms")
+    print(f"🌐 URL: http://127.0.0.1:{config.FLASK_PORT}")
     print()
     print("⚠️  Para cerrar el programa: presiona Ctrl+C")
     print("=" * 50)
     print()
     
+    # Compactar registros antiguos ya enviados
+    resultado = lector.archivar_registros(config.DIAS_ANTES_DE_ARCHIVAR)
+    if resultado['archivados']:
+        print(f"🗄️  Registros archivados: {resultado['archivados']}")
+    
     # Abrir navegador en un hilo separado
     threading.Thread(target=abrir_navegador, daemon=True).start()
     
     # Iniciar servidor Flask
     try:
-        app.run(host='127.0.0.1', port=5000, debug=False, use_reloader=False)
+        if config.SERVIDOR_MODO == "produccion":
+            iniciar_servidor_produccion()
+        else:
+            app.run(
+                host=config.SERVIDOR_HOST,
+                port=config.FLASK_PORT,
+                debug=config.FLASK_DEBUG,
+                use_reloader=False,
+                threaded=True
+            )
     except KeyboardInterrupt:
         print("\n\n👋 Cerrando QR-Asist...")
         print("✅ Programa cerrado correctamente")
@@ -0,0 +1,358 @@
+"""
+Módulo Archivador de Registros
+Compacta los archivos de asistencia ya enviados de días cerrados en
+segmentos mensuales comprimidos con un índice de posiciones, para poder
+leer un día o un alumno sin descomprimir todo el mes
+"""
+
+import os
+import csv
+import gzip
+import io
+import json
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+from modules.metricas import metricas
+
+CARPETA_ARCHIVO = 'archivo'
+VERSION_ARCHIVO = 1
+
+
+def sincronizar_carpeta(carpeta):
+    """fsync de la carpeta para que un reemplazo de archivo sea durable"""
+    try:
+        fd = os.open(carpeta, os.O_RDONLY)
+    except (OSError, AttributeError):
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Windows no permite fsync sobre carpetas
+        pass
+    finally:
+        os.close(fd)
+
+
+def nombre_miembro(miembro):
+    """Nombre guardado en la cabecera de un miembro gzip (FNAME), o None"""
+    if len(miembro) < 10 or not miembro[3] & 0x08:
+        return None
+    inicio = 10
+    if miembro[3] & 0x04:
+        # Campo FEXTRA antes del nombre
+        inicio += 2 + int.from_bytes(miembro[10:12], 'little')
+    fin = miembro.find(b'\0', inicio)
+    if fin < 0:
+        return None
+    return miembro[inicio:fin].decode('latin-1')
+
+
+class ArchivadorRegistro:
+    """Segmentos mensuales asistencia_AAAAMM.gz + índice asistencia_AAAAMM.idx.json
+
+    Cada día se guarda como un miembro gzip independiente dentro del
+    segmento del mes; el índice guarda su posición y longitud, así que leer
+    un día es un seek + una descompresión. El segmento completo sigue siendo
+    un .gz válido (zcat devuelve todos los días concatenados).
+    """
+
+    def __init__(self, registro_dir):
+        self.registro_dir = registro_dir
+        self.archivo_dir = os.path.join(registro_dir, CARPETA_ARCHIVO)
+        self.bloqueo = threading.RLock()
+        self.indices = {}  # {mes: (mtime_ns, datos del índice)}
+        self.filas_meses = {}  # {mes: (datos del índice, filas de listar)}
+
+    # ==================== RUTAS E ÍNDICES ====================
+
+    def ruta_segmento(self, mes):
+        return os.path.join(self.archivo_dir, f"asistencia_{mes}.gz")
+
+    def ruta_indice(self, mes):
+        return os.path.join(self.archivo_dir, f"asistencia_{mes}.idx.json")
+
+    def meses(self):
+        """Meses que tienen segmento archivado (o solo índice)"""
+        if not os.path.isdir(self.archivo_dir):
+            return []
+        meses = set()
+        for nombre in os.listdir(self.archivo_dir):
+            if not nombre.startswith('asistencia_'):
+                continue
+            for extension in ('.idx.json', '.gz'):
+                if nombre.endswith(extension):
+                    meses.add(nombre[len('asistencia_'):-len(extension)])
+        return sorted(meses)
+
+    def cargar_indice(self, mes):
+        """Índice del mes (en cache mientras el archivo no cambie).
+
+        Si el índice falta o está dañado (corte de luz durante el guardado)
+        se reconstruye recorriendo los miembros gzip del segmento.
+        """
+        ruta = self.ruta_indice(mes)
+        try:
+            mtime = os.stat(ruta).st_mtime_ns
+        except OSError:
+            if os.path.exists(self.ruta_segmento(mes)):
+                return self.reconstruir_indice(mes)
+            return {'version': VERSION_ARCHIVO, 'archivos': {}}
+
+        cache = self.indices.get(mes)
+        if cache and cache[0] == mtime:
+            return cache[1]
+
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            if not isinstance(datos.get('archivos'), dict):
+                raise ValueError("índice sin 'archivos'")
+        except (OSError, ValueError) as e:
+            print(f"Índice de archivo {mes} dañado ({e}); reconstruyendo...")
+            return self.reconstruir_indice(mes)
+
+        self.indices[mes] = (mtime, datos)
+        return datos
+
+    def reconstruir_indice(self, mes):
+        """Rehacer el índice de un mes a partir de su segmento .gz"""
+        metricas.incrementar('archivo_indices_reconstruidos_total')
+        archivos = {}
+        try:
+            with open(self.ruta_segmento(mes), 'rb') as f:
+                segmento = f.read()
+        except OSError as e:
+            print(f"No se pudo leer el segmento {mes}: {e}")
+            return {'version': VERSION_ARCHIVO, 'archivos': {}}
+
+        posicion = 0
+        while posicion < len(segmento):
+            descompresor = zlib.decompressobj(wbits=31)
+            try:
+                contenido = descompresor.decompress(segmento[posicion:])
+            except zlib.error:
+                # Miembro final incompleto (corte durante la escritura)
+                break
+            if not descompresor.eof:
+                break
+            longitud = len(segmento) - posicion - len(descompresor.unused_data)
+
+            nombre = nombre_miembro(segmento[posicion:posicion + longitud])
+            filas = list(csv.DictReader(io.StringIO(contenido.decode('utf-8'))))
+            if not nombre and filas:
+                # Miembros sin nombre: se deduce de la laptop y la fecha
+                fila = filas[0]
+                nombre = f"asistencia_{fila.get('LAPTOP', '')}_{fila.get('FECHA', '').replace('-', '')}.txt"
+            if nombre:
+                archivos[nombre] = {
+                    'posicion': posicion,
+                    'longitud': longitud,
+                    'tamano': len(contenido),
+                    'fecha': nombre[:-len('.txt')].split('_')[-1],
+                    'registros': len(filas),
+                    'fecha_envio': "Desconocida",
+                    'ids': sorted(set(fila.get('ID', '') for fila in filas) - {''})
+                }
+            posicion += longitud
+
+        datos = {'version': VERSION_ARCHIVO, 'archivos': archivos}
+        try:
+            self.guardar_indice(mes, datos)
+        except OSError as e:
+            print(f"No se pudo guardar el índice reconstruido {mes}: {e}")
+        return datos
+
+    def guardar_indice(self, mes, datos):
+        """Guardar el índice de forma atómica y durable (fsync + reemplazo)"""
+        ruta = self.ruta_indice(mes)
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta + '.tmp', ruta)
+        sincronizar_carpeta(self.archivo_dir)
+        self.indices.pop(mes, None)
+
+    def mes_de(self, nombre_archivo):
+        """Mes (AAAAMM) a partir de asistencia_LAPTOP_A_20260113.txt"""
+        fecha_str = nombre_archivo[:-len('.txt')].split('_')[-1]
+        datetime.strptime(fecha_str, "%Y%m%d")
+        return fecha_str[:6]
+
+    # ==================== ARCHIVADO ====================
+
+    def candidatos(self, dias_minimos):
+        """Archivos enviados cuya fecha ya cerró hace al menos N días"""
+        limite = (datetime.now() - timedelta(days=dias_minimos)).strftime("%Y%m%d")
+        hoy = datetime.now().strftime("%Y%m%d")
+        nombres = set(os.listdir(self.registro_dir))
+
+        for nombre in sorted(nombres):
+            if not (nombre.startswith('asistencia_') and nombre.endswith('.txt')):
+                continue
+            if nombre + '.enviado' not in nombres:
+                continue
+            fecha_str = nombre[:-len('.txt')].split('_')[-1]
+            if fecha_str >= hoy or fecha_str > limite:
+                continue
+            yield nombre
+
+    def archivar(self, dias_minimos=7):
+        """Mover los archivos enviados de días cerrados a su segmento mensual"""
+        with self.bloqueo:
+            os.makedirs(self.archivo_dir, exist_ok=True)
+            archivados = []
+            errores = []
+
+            for nombre in self.candidatos(dias_minimos):
+                try:
+                    with metricas.medir('archivado_segundos'):
+                        self.archivar_archivo(nombre)
+                    archivados.append(nombre)
+                except (OSError, ValueError) as e:
+                    metricas.incrementar('errores_total', operacion='archivar', tipo=type(e).__name__)
+                    errores.append({'nombre': nombre, 'error': str(e)})
+
+            metricas.incrementar('archivos_archivados_total', len(archivados))
+            return {
+                'success': not errores,
+                'archivados': len(archivados),
+                'errores': errores
+            }
+
+    def archivar_archivo(self, nombre):
+        """Agregar un archivo al segmento de su mes y borrar el original"""
+        mes = self.mes_de(nombre)
+        ruta = os.path.join(self.registro_dir, nombre)
+        ruta_marca = ruta + '.enviado'
+        indice = self.cargar_indice(mes)
+
+        if nombre not in indice['archivos']:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            with open(ruta_marca, 'r') as f:
+                fecha_envio = f.read().strip()
+
+            texto = contenido.decode('utf-8')
+            filas = list(csv.DictReader(io.StringIO(texto)))
+            # El nombre del archivo va en la cabecera gzip (campo FNAME) para
+            # poder reconstruir el índice si se pierde
+            buffer = io.BytesIO()
+            with gzip.GzipFile(filename=nombre, mode='wb', fileobj=buffer, mtime=0) as gz:
+                gz.write(contenido)
+            comprimido = buffer.getvalue()
+
+            # Agregar al final del segmento; si el proceso se corta antes de
+            # guardar el índice, los bytes huérfanos simplemente se ignoran
+            ruta_segmento = self.ruta_segmento(mes)
+            with open(ruta_segmento, 'ab') as f:
+                posicion = f.seek(0, os.SEEK_END)
+                f.write(comprimido)
+                f.flush()
+                os.fsync(f.fileno())
+
+            indice = dict(indice, archivos=dict(indice['archivos']))
+            indice['version'] = VERSION_ARCHIVO
+            indice['archivos'][nombre] = {
+                'posicion': posicion,
+                'longitud': len(comprimido),
+                'tamano': len(contenido),
+                'fecha': nombre[:-len('.txt')].split('_')[-1],
+                'registros': len(filas),
+                'fecha_envio': fecha_envio,
+                'ids': sorted(set(fila.get('ID', '') for fila in filas) - {''})
+            }
+            self.guardar_indice(mes, indice)
+
+        # Ya está en el índice: recién ahora se borran los originales
+        os.remove(ruta)
+        if os.path.exists(ruta_marca):
+            os.remove(ruta_marca)
+
+    # ==================== LECTURA ====================
+
+    def buscar(self, nombre):
+        """Entrada del índice para un archivo archivado (o None)"""
+        try:
+            mes = self.mes_de(nombre)
+        except ValueError:
+            return None, None
+        entrada = self.cargar_indice(mes)['archivos'].get(nombre)
+        return mes, entrada
+
+    def leer_bytes(self, mes, entrada):
+        """Descomprimir solo el miembro de un día"""
+        with open(self.ruta_segmento(mes), 'rb') as f:
+            f.seek(entrada['posicion'])
+            comprimido = f.read(entrada['longitud'])
+        return gzip.decompress(comprimido)
+
+    def leer(self, nombre):
+        """Bytes originales de un archivo archivado (idénticos al .txt), o None"""
+        with self.bloqueo:
+            mes, entrada = self.buscar(nombre)
+            if entrada is None:
+                return None
+            return self.leer_bytes(mes, entrada)
+
+    def filas_mes(self, mes):
+        """Filas de listar de un mes; las fechas se interpretan una sola vez
+        por versión del índice"""
+        indice = self.cargar_indice(mes)
+        guardadas = self.filas_meses.get(mes)
+        if guardadas and guardadas[0] is indice:
+            return guardadas[1]
+
+        filas = []
+        for nombre, entrada in indice['archivos'].items():
+            fecha = datetime.strptime(entrada['fecha'], "%Y%m%d")
+            filas.append({
+                'nombre': nombre,
+                'ruta': self.ruta_segmento(mes),
+                'fecha': fecha.strftime("%d/%m/%Y"),
+                'fecha_sort': fecha,
+                'registros': entrada['registros'],
+                'estado': "enviado",
+                'fecha_envio': entrada['fecha_envio'],
+                'archivado': True
+            })
+        self.filas_meses[mes] = (indice, filas)
+        return filas
+
+    def listar(self):
+        """Archivos archivados con el formato de listar_archivos_registro"""
+        archivos = []
+        with self.bloqueo:
+            for mes in self.meses():
+                archivos.extend(self.filas_mes(mes))
+        return archivos
+
+    def resumen(self):
+        """Una fila por mes archivado (días y registros), del más reciente al más antiguo"""
+        meses = []
+        with self.bloqueo:
+            for mes in reversed(self.meses()):
+                filas = self.filas_mes(mes)
+                if filas:
+                    meses.append({
+                        'mes': f"{mes[4:]}/{mes[:4]}",
+                        'dias': len(filas),
+                        'registros': sum(fila['registros'] for fila in filas)
+                    })
+        return meses
+
+    def registros_alumno(self, id_alumno):
+        """Asistencias archivadas de un alumno (solo se abren sus días)"""
+        registros = []
+        with self.bloqueo:
+            for mes in self.meses():
+                for nombre, entrada in sorted(self.cargar_indice(mes)['archivos'].items()):
+                    if id_alumno not in entrada['ids']:
+                        continue
+                    texto = self.leer_bytes(mes, entrada).decode('utf-8')
+                    for fila in csv.DictReader(io.StringIO(texto)):
+                        if fila.get('ID') == id_alumno:
+                            registros.append(fila)
+        return registros
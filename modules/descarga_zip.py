@@ -0,0 +1,110 @@
+"""
+Módulo de Descarga ZIP
+Empaquetado en streaming de los códigos QR generados, sin construir
+el archivo en memoria ni en disco
+"""
+
+import os
+import zipfile
+
+from modules.metricas import metricas
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+class SalidaStreaming:
+    """Destino de escritura no posicionable que acumula bytes por bloques"""
+
+    def __init__(self):
+        self.bloques = []
+        self.posicion = 0
+
+    def write(self, datos):
+        if datos:
+            self.bloques.append(bytes(datos))
+            self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        """Devolver y descartar lo acumulado hasta ahora"""
+        datos = b''.join(self.bloques)
+        self.bloques = []
+        return datos
+
+
+def carpetas_grupo(qr_dir, nivel=None, grado=None, seccion=None):
+    """Carpetas a incluir: un grupo o todo el colegio"""
+    if not os.path.isdir(qr_dir):
+        return []
+
+    if nivel and grado and seccion:
+        nombre = f"{nivel}_{grado}_{seccion}"
+        carpeta = os.path.realpath(os.path.join(qr_dir, nombre))
+        # Evitar rutas fuera de la carpeta de QR (../ en los parámetros)
+        if os.path.dirname(carpeta) != os.path.realpath(qr_dir) or not os.path.isdir(carpeta):
+            return []
+        return [carpeta]
+
+    return [
+        os.path.join(qr_dir, nombre)
+        for nombre in sorted(os.listdir(qr_dir))
+        if os.path.isdir(os.path.join(qr_dir, nombre))
+    ]
+
+
+def archivos_qr(carpetas):
+    """Imágenes PNG de las carpetas, con su nombre dentro del ZIP"""
+    for carpeta in carpetas:
+        grupo = os.path.basename(carpeta)
+        for nombre in sorted(os.listdir(carpeta)):
+            if nombre.lower().endswith('.png'):
+                yield os.path.join(carpeta, nombre), f"{grupo}/{nombre}"
+
+
+def generar_zip(carpetas):
+    """Generador de bloques de un ZIP con las imágenes QR de las carpetas.
+
+    Los PNG ya están comprimidos, así que se guardan sin compresión
+    (ZIP_STORED); cada archivo se copia por bloques y se emite en cuanto se
+    escribe, de modo que la memoria usada no depende del tamaño del ZIP.
+    """
+    salida = SalidaStreaming()
+    total = 0
+
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for ruta, nombre_zip in archivos_qr(carpetas):
+            try:
+                info = zipfile.ZipInfo.from_file(ruta, nombre_zip)
+                info.compress_type = zipfile.ZIP_STORED
+                with open(ruta, 'rb') as origen, zf.open(info, 'w') as destino:
+                    while True:
+                        bloque = origen.read(TAMANO_BLOQUE)
+                        if not bloque:
+                            break
+                        destino.write(bloque)
+                        datos = salida.vaciar()
+                        if datos:
+                            yield datos
+            except OSError as e:
+                # Archivo borrado o ilegible durante la descarga: se omite
+                metricas.incrementar('errores_total', operacion='descarga_zip', tipo=type(e).__name__)
+                continue
+
+            total += 1
+            datos = salida.vaciar()
+            if datos:
+                yield datos
+
+    # Directorio central del ZIP
+    datos = salida.vaciar()
+    if datos:
+        yield datos
+
+    metricas.incrementar('descargas_zip_total')
+    metricas.incrementar('descargas_zip_archivos_total', total)
@@ -6,12 +6,404 @@ Lógica para crear códigos QR y PDFs
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
 import os
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import time
 import unicodedata
 
+from modules.metricas import metricas
+
+# Diseño por defecto de las hojas de impresión (columnas x filas)
+DISENO_PREDETERMINADO = (3, 3)
+
+def parsear_diseno(texto):
+    """Convertir '4x5' en (columnas, filas); None usa el diseño por defecto"""
+    if not texto:
+        return DISENO_PREDETERMINADO
+    try:
+        columnas, filas = (int(n) for n in str(texto).lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Diseño inválido '{texto}' (usar COLUMNASxFILAS, por ejemplo 4x5)")
+    if not (1 <= columnas <= 10 and 1 <= filas <= 10):
+        raise ValueError("El diseño debe tener entre 1 y 10 columnas y filas")
+    return columnas, filas
+
+def titulo_grupo(nivel, grado, seccion):
+    """Texto para portadas y marcadores: 'Primaria 5° A'"""
+    return f"{nivel} {grado}° {seccion}"
+
+def dibujar_divisor(c, titulo, total):
+    """Página separadora de una sección, con su marcador en el PDF"""
+    from reportlab.lib.pagesizes import A4
+    
+    ancho, alto = A4
+    clave = f"seccion_{c.getPageNumber()}"
+    c.bookmarkPage(clave)
+    c.addOutlineEntry(titulo, clave, level=0)
+    
+    c.setFont("Helvetica-Bold", 32)
+    c.drawCentredString(ancho / 2, alto / 2 + 20, titulo)
+    c.setFont("Helvetica", 14)
+    c.drawCentredString(ancho / 2, alto / 2 - 20, f"{total} alumnos")
+    c.showPage()
+
+def dibujar_qrs(c, qrs, columnas, filas):
+    """Dibujar QR con el nombre debajo, columnas x filas por página"""
+    from reportlab.lib.pagesizes import A4
+    
+    ancho, alto = A4
+    qr_por_pagina = columnas * filas
+    
+    margen = 40
+    espacio_x = (ancho - 2 * margen) / columnas
+    espacio_y = (alto - 2 * margen) / filas
+    
+    qr_size = min(espacio_x, espacio_y) * 0.8
+    
+    # Iterar sobre los QR generados
+    for idx, qr_info in enumerate(qrs):
+        # Nueva página si es necesario
+        if idx > 0 and idx % qr_por_pagina == 0:
+            c.showPage()
+        
+        # Calcular posición
+        pos_en_pagina = idx % qr_por_pagina
+        fila = pos_en_pagina // columnas
+        columna = pos_en_pagina % columnas
+        
+        x = margen + columna * espacio_x + (espacio_x - qr_size) / 2
+        y = alto - margen - (fila + 1) * espacio_y + (espacio_y - qr_size) / 2
+        
+        # Dibujar imagen QR
+        c.drawImage(
+            qr_info['ruta'],
+            x, y,
+            width=qr_size,
+            height=qr_size
+        )
+        
+        # Agregar nombre del alumno debajo del QR
+        c.setFont("Helvetica", 8)
+        nombre = qr_info['alumno']
+        # Truncar nombre si es muy largo
+        if len(nombre) > 25:
+            nombre = nombre[:22] + "..."
+        
+        texto_x = x + qr_size / 2
+        texto_y = y - 12
+        c.drawCentredString(texto_x, texto_y, nombre)
+    
+    c.showPage()
+
+def renderizar_seccion(grupo, diseno, qr_dir, ruta_pdf=None):
+    """Tarea de un proceso de trabajo: generar los QR de una sección y,
+    si se indica ruta_pdf, su PDF con página separadora.
+    
+    Las métricas del proceso de trabajo no llegan al proceso principal, así
+    que la duración de la sección vuelve en el resultado ('duracion')
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    
+    inicio = time.perf_counter()
+    generador = GeneradorQR()
+    generador.qr_dir = qr_dir
+    resultado = generador.generar_codigos_qr(
+        grupo['alumnos'], grupo['nivel'], grupo['grado'], grupo['seccion']
+    )
+    
+    if ruta_pdf and resultado['generados']:
+        c = canvas.Canvas(ruta_pdf, pagesize=A4)
+        dibujar_divisor(c, titulo_grupo(grupo['nivel'], grupo['grado'], grupo['seccion']), len(resultado['generados']))
+        dibujar_qrs(c, resultado['generados'], *diseno)
+        c.save()
+    
+    resultado['duracion'] = time.perf_counter() - inicio
+    return resultado
+
+class RenderizadorCarnet:
+    """Carnets PNG (QR + nombre completo + nivel/grado/sección) con PIL.
+    
+    La plantilla, las fuentes, el rótulo de cada grupo y el ancho de cada
+    palabra se calculan una sola vez y se reutilizan en todo el lote. Con la
+    plantilla dibujada el carnet se arma directamente en modo P (índices de
+    la paleta), sin componer en RGB ni cuantizar cada tarjeta.
+    """
+    
+    # Tamaño de tarjeta CR80 (54 x 85,6 mm) a 300 ppp, en vertical
+    ANCHO = 638
+    ALTO = 1011
+    MARGEN = 40
+    ALTO_CABECERA = 110
+    LADO_QR = 520
+    Y_QR = 140
+    Y_NOMBRE = 680
+    ALTO_PIE = 120
+    
+    COLOR_PRINCIPAL = (31, 78, 121)
+    COLOR_TEXTO = (33, 37, 41)
+    
+    # Tamaños de letra del nombre, de mayor a menor; se prefiere no pasar de
+    # MAX_LINEAS_NOMBRE y, si no alcanza, se usa todo el alto sobre el pie
+    TAMANOS_NOMBRE = (44, 38, 32, 27, 23, 20)
+    MAX_LINEAS_NOMBRE = 3
+    
+    # Anchos de palabra guardados como máximo (se vacía al llenarse)
+    MAX_ANCHOS = 20000
+    
+    # Palabras dibujadas guardadas como máximo (~10 KB cada una a 44 px, así
+    # que unos 10 MB); el renderizador vive mientras corre el servidor
+    MAX_PALABRAS = 1000
+    
+    # Índices de la paleta: 0-15 blanco→negro, 16-31 blanco→texto,
+    # 32-47 color principal→blanco (ver obtener_paleta)
+    INDICE_NEGRO = 15
+    INDICE_TEXTO = 16
+    
+    FUENTES_NEGRITA = ('DejaVuSans-Bold.ttf', 'arialbd.ttf', 'Arial Bold.ttf', 'LiberationSans-Bold.ttf')
+    FUENTES_NORMAL = ('DejaVuSans.ttf', 'arial.ttf', 'Arial.ttf', 'LiberationSans-Regular.ttf')
+    
+    def __init__(self, ruta_plantilla=None):
+        self.ruta_plantilla = ruta_plantilla
+        self.fuentes = {}  # {(tamaño, negrita): ImageFont}
+        self.plantilla = None
+        self.plantilla_indices = None
+        self.plantilla_propia = False
+        self.paleta = None
+        self.rotulos_grupo = {}  # {(nivel, grado, seccion): Image}
+        self.anchos = {}  # {(tamaño, palabra): ancho en px}
+        self.palabras = {}  # {(tamaño, palabra): (máscara L, desplazamiento x)}
+        
+        # Tablas para pasar imágenes en escala de grises a índices de la paleta
+        self.tabla_qr = bytes(self.INDICE_NEGRO if v < 128 else 0 for v in range(256))
+        self.tabla_texto = bytes([0] + [self.INDICE_TEXTO + round(v * 15 / 255) for v in range(1, 256)])
+    
+    def fuente(self, tamano, negrita=False):
+        """Fuente TrueType del sistema (o la de PIL si no hay ninguna)"""
+        clave = (tamano, negrita)
+        if clave not in self.fuentes:
+            fuente = None
+            for nombre in (self.FUENTES_NEGRITA if negrita else self.FUENTES_NORMAL):
+                try:
+                    fuente = ImageFont.truetype(nombre, tamano)
+                    break
+                except OSError:
+                    continue
+            self.fuentes[clave] = fuente or ImageFont.load_default(tamano)
+        return self.fuentes[clave]
+    
+    def obtener_plantilla(self):
+        """Fondo del carnet: imagen propia (si existe) o plantilla dibujada"""
+        if self.plantilla is None:
+            if self.ruta_plantilla and os.path.exists(self.ruta_plantilla):
+                plantilla = Image.open(self.ruta_plantilla).convert('RGB')
+                plantilla = plantilla.resize((self.ANCHO, self.ALTO))
+                self.plantilla_propia = True
+            else:
+                plantilla = Image.new('RGB', (self.ANCHO, self.ALTO), 'white')
+                dibujo = ImageDraw.Draw(plantilla)
+                dibujo.rectangle((0, 0, self.ANCHO, self.ALTO_CABECERA), fill=self.COLOR_PRINCIPAL)
+                dibujo.text(
+                    (self.ANCHO / 2, self.ALTO_CABECERA / 2), "CONTROL DE ASISTENCIA",
+                    font=self.fuente(36, negrita=True), fill='white', anchor='mm'
+                )
+                dibujo.rectangle((0, self.ALTO - self.ALTO_PIE, self.ANCHO, self.ALTO), fill=self.COLOR_PRINCIPAL)
+                dibujo.rectangle((0, 0, self.ANCHO - 1, self.ALTO - 1), outline=self.COLOR_PRINCIPAL, width=4)
+            self.plantilla = plantilla
+        return self.plantilla
+    
+    def obtener_plantilla_indices(self):
+        """Plantilla dibujada ya convertida a la paleta (modo P)"""
+        if self.plantilla_indices is None:
+            self.plantilla_indices = self.cuantizar(self.obtener_plantilla())
+        return self.plantilla_indices
+    
+    def obtener_paleta(self):
+        """Paleta fija para guardar los carnets en modo P.
+        
+        Un PNG con paleta pesa un tercio y se codifica mucho más rápido que
+        uno RGB; la paleta cubre los degradados del texto suavizado.
+        """
+        if self.paleta is None:
+            blanco, negro = (255, 255, 255), (0, 0, 0)
+            colores = []
+            for fondo, tinta in ((blanco, negro), (blanco, self.COLOR_TEXTO), (self.COLOR_PRINCIPAL, blanco)):
+                # 16 tonos por degradado: con más, PIL confunde el blanco
+                # con tonos casi blancos al asignar colores de la paleta
+                for i in range(16):
+                    t = i / 15
+                    colores.extend(round(f + (c - f) * t) for f, c in zip(fondo, tinta))
+            if self.plantilla_propia:
+                # Los degradados fijos van primero y el resto de la paleta
+                # se llena con los colores de la plantilla propia
+                libres = 256 - len(colores) // 3
+                plantilla = self.obtener_plantilla().quantize(libres, method=Image.Quantize.FASTOCTREE)
+                colores.extend(plantilla.getpalette()[:3 * libres])
+            paleta = Image.new('P', (1, 1))
+            paleta.putpalette(colores + [255] * (768 - len(colores)))
+            self.paleta = paleta
+        return self.paleta
+    
+    def cuantizar(self, imagen):
+        """Imagen RGB a modo P con la paleta fija, sin tramado"""
+        return imagen.quantize(palette=self.obtener_paleta(), dither=Image.Dither.NONE)
+    
+    def indices(self, imagen, tabla):
+        """Imagen L convertida a índices de la paleta (modo P) con una tabla"""
+        imagen = Image.frombytes('P', imagen.size, imagen.tobytes().translate(tabla))
+        imagen.putpalette(self.obtener_paleta().getpalette())
+        return imagen
+    
+    def rotulo_grupo(self, nivel, grado, seccion):
+        """Franja inferior con nivel, grado y sección (una por grupo)"""
+        clave = (nivel, grado, seccion)
+        if clave not in self.rotulos_grupo:
+            rotulo = Image.new('RGB', (self.ANCHO - 8, self.ALTO_PIE - 4), self.COLOR_PRINCIPAL)
+            ImageDraw.Draw(rotulo).text(
+                (rotulo.width / 2, rotulo.height / 2), titulo_grupo(nivel, grado, seccion),
+                font=self.fuente(40, negrita=True), fill='white', anchor='mm'
+            )
+            if not self.plantilla_propia:
+                rotulo = self.cuantizar(rotulo)
+            self.rotulos_grupo[clave] = rotulo
+        return self.rotulos_grupo[clave]
+    
+    # ==================== NOMBRE ====================
+    
+    def ancho_palabra(self, palabra, tamano):
+        """Ancho en px de una palabra (los nombres y apellidos se repiten)"""
+        clave = (tamano, palabra)
+        ancho = self.anchos.get(clave)
+        if ancho is None:
+            if len(self.anchos) >= self.MAX_ANCHOS:
+                self.anchos.clear()
+            ancho = self.fuente(tamano, negrita=True).getlength(palabra)
+            self.anchos[clave] = ancho
+        return ancho
+    
+    def mascara_palabra(self, palabra, tamano):
+        """Palabra ya dibujada (máscara suavizada) y su desplazamiento en x"""
+        clave = (tamano, palabra)
+        guardada = self.palabras.get(clave)
+        if guardada is None:
+            if len(self.palabras) >= self.MAX_PALABRAS:
+                self.palabras.clear()
+            fuente = self.fuente(tamano, negrita=True)
+            izquierda, _, derecha, _ = fuente.getbbox(palabra, anchor='la')
+            izquierda = min(0, izquierda)
+            mascara = Image.new('L', (max(1, derecha - izquierda), int(tamano * 1.2)))
+            ImageDraw.Draw(mascara).text((-izquierda, 0), palabra, font=fuente, fill=255, anchor='la')
+            guardada = (mascara, izquierda)
+            self.palabras[clave] = guardada
+        return guardada
+    
+    def partir_palabra(self, palabra, fuente, ancho_max):
+        """Cortar por letras una palabra más ancha que la línea"""
+        partes = ['']
+        for letra in palabra:
+            if partes[-1] and fuente.getlength(partes[-1] + letra) > ancho_max:
+                partes.append(letra)
+            else:
+                partes[-1] += letra
+        return partes
+    
+    def envolver(self, palabras, tamano, ancho_max):
+        """Repartir las palabras en líneas de como máximo ancho_max px"""
+        fuente = self.fuente(tamano, negrita=True)
+        ancho_espacio = self.ancho_palabra(' ', tamano)
+        lineas = []  # [[texto, ancho], ...]
+        for palabra in palabras:
+            ancho = self.ancho_palabra(palabra, tamano)
+            if ancho <= ancho_max:
+                piezas = [(palabra, ancho)]
+            else:
+                piezas = [(p, fuente.getlength(p)) for p in self.partir_palabra(palabra, fuente, ancho_max)]
+            for pieza, ancho in piezas:
+                if lineas and lineas[-1][1] + ancho_espacio + ancho <= ancho_max:
+                    lineas[-1][0] += ' ' + pieza
+                    lineas[-1][1] += ancho_espacio + ancho
+                else:
+                    lineas.append([pieza, ancho])
+        return [texto for texto, _ in lineas]
+    
+    def ajustar_nombre(self, nombre):
+        """Partir el nombre completo en líneas que quepan sobre el pie.
+        
+        Devuelve (fuente, tamaño, líneas). Se elige la letra más grande que
+        deje el nombre en MAX_LINEAS_NOMBRE líneas; si ninguna alcanza, la
+        más grande que entre en el alto disponible. Solo un nombre imposible
+        (cientos de letras) se corta, con puntos suspensivos.
+        """
+        ancho_max = self.ANCHO - 2 * self.MARGEN
+        espacio = self.ALTO - self.ALTO_PIE - self.Y_NOMBRE
+        palabras = nombre.split()
+        
+        for limite in (self.MAX_LINEAS_NOMBRE, None):
+            for tamano in self.TAMANOS_NOMBRE:
+                caben = espacio // int(tamano * 1.2)
+                lineas = self.envolver(palabras, tamano, ancho_max)
+                if len(lineas) <= min(limite or caben, caben):
+                    return self.fuente(tamano, negrita=True), tamano, lineas
+        
+        fuente = self.fuente(tamano, negrita=True)
+        lineas = lineas[:caben]
+        while lineas[-1] and fuente.getlength(lineas[-1] + '…') > ancho_max:
+            lineas[-1] = lineas[-1][:-1]
+        lineas[-1] += '…'
+        return fuente, tamano, lineas
+    
+    # ==================== COMPOSICIÓN ====================
+    
+    def renderizar(self, img_qr, nombre, nivel, grado, seccion, tamano_modulo=10):
+        """Componer el carnet a partir de la imagen QR ya generada"""
+        plantilla = self.obtener_plantilla()
+        
+        # QR reducido a 1 px por módulo y ampliado por un factor entero,
+        # para que todos los módulos midan igual (bordes nítidos al leerlo)
+        modulos = img_qr.width // tamano_modulo
+        qr = img_qr.resize((modulos, modulos), Image.NEAREST).convert('L')
+        lado = modulos * max(1, self.LADO_QR // modulos)
+        posicion_qr = ((self.ANCHO - lado) // 2, self.Y_QR + (self.LADO_QR - lado) // 2)
+        
+        # Nombre completo, centrado y en varias líneas si hace falta; se
+        # dibuja como máscara suavizada del área libre entre el QR y el pie
+        fuente, tamano, lineas = self.ajustar_nombre(nombre)
+        alto_linea = int(tamano * 1.2)
+        espacio = self.ALTO - self.ALTO_PIE - self.Y_NOMBRE
+        # (cada palabra se dibuja una vez por lote y luego solo se pega)
+        mascara = Image.new('L', (self.ANCHO - self.MARGEN, espacio))
+        ancho_espacio = self.ancho_palabra(' ', tamano)
+        y = max(0, (espacio - alto_linea * len(lineas)) // 2)
+        for linea in lineas:
+            palabras = linea.split(' ')
+            ancho_linea = sum(self.ancho_palabra(p, tamano) for p in palabras) + ancho_espacio * (len(palabras) - 1)
+            x = (mascara.width - ancho_linea) / 2
+            for palabra in palabras:
+                imagen, desplazamiento = self.mascara_palabra(palabra, tamano)
+                mascara.paste(imagen, (round(x + desplazamiento), y))
+                x += self.ancho_palabra(palabra, tamano) + ancho_espacio
+            y += alto_linea
+        posicion_nombre = (self.MARGEN // 2, self.Y_NOMBRE)
+        
+        if self.plantilla_propia:
+            # Fondo propio: se compone en RGB y se cuantiza la tarjeta entera
+            carnet = plantilla.copy()
+            carnet.paste(qr.resize((lado, lado), Image.NEAREST), posicion_qr)
+            carnet.paste(self.COLOR_TEXTO, (*posicion_nombre, posicion_nombre[0] + mascara.width, self.ALTO - self.ALTO_PIE), mascara)
+            carnet.paste(self.rotulo_grupo(nivel, grado, seccion), (4, self.ALTO - self.ALTO_PIE))
+            return self.cuantizar(carnet)
+        
+        # Plantilla dibujada: el QR y el nombre caen sobre blanco, así que se
+        # pegan directamente como índices de la paleta
+        carnet = self.obtener_plantilla_indices().copy()
+        carnet.paste(self.indices(qr, self.tabla_qr).resize((lado, lado), Image.NEAREST), posicion_qr)
+        carnet.paste(self.indices(mascara, self.tabla_texto), posicion_nombre)
+        carnet.paste(self.rotulo_grupo(nivel, grado, seccion), (4, self.ALTO - self.ALTO_PIE))
+        return carnet
+
 class GeneradorQR:
     """Clase para generar códigos QR y PDFs"""
     
@@ -20,12 +412,22 @@ class GeneradorQR:
         self.qr_dir = os.path.join(self.base_dir, 'datos', 'qr_codes')
         os.makedirs(self.qr_dir, exist_ok=True)
         self.carpeta_actual = None
+        self.renderizador = None
+    
+    def obtener_renderizador(self):
+        """Renderizador de carnets (comparte sus caches entre lotes)"""
+        if self.renderizador is None:
+            ruta_plantilla = os.path.join(self.base_dir, 'datos', 'plantilla_carnet.png')
+            self.renderizador = RenderizadorCarnet(ruta_plantilla)
+        return self.renderizador
     
     def crear_carpeta_grupo(self, nivel, grado, seccion):
         """Crear carpeta específica para el grupo"""
         nombre_carpeta = f"{nivel}_{grado}_{seccion}"
         carpeta_completa = os.path.join(self.qr_dir, nombre_carpeta)
         os.makedirs(carpeta_completa, exist_ok=True)
+        # Solo informativo: las operaciones usan la carpeta que reciben, para
+        # que llamadas concurrentes de distintos grupos no se mezclen
         self.carpeta_actual = carpeta_completa
         return carpeta_completa
     
@@ -35,12 +437,13 @@ class GeneradorQR:
         # Asegura que los caracteres con tildes se codifiquen de forma estándar
         return unicodedata.normalize('NFC', texto)
     
-    def generar_qr_individual(self, alumno, nivel, grado, seccion):
+    def generar_qr_individual(self, alumno, nivel, grado, seccion, carpeta=None, carnet=False):
         """Generar código QR para un alumno individual"""
+        inicio = time.perf_counter()
         try:
             # Crear carpeta del grupo si no existe
-            if not self.carpeta_actual:
-                self.crear_carpeta_grupo(nivel, grado, seccion)
+            if not carpeta:
+                carpeta = self.crear_carpeta_grupo(nivel, grado, seccion)
             
             # Formato del QR: ID|Nombre|Nivel|Grado|Seccion
             datos_qr = f"{alumno['id']}|{alumno['nombre']}|{nivel}|{grado}|{seccion}"
@@ -65,55 +468,80 @@ class GeneradorQR:
             
             # Guardar imagen en carpeta del grupo
             nombre_archivo = f"{alumno['nombre'].replace(' ', '_')}_QR.png"
-            ruta_completa = os.path.join(self.carpeta_actual, nombre_archivo)
+            ruta_completa = os.path.join(carpeta, nombre_archivo)
             img.save(ruta_completa)
             
-            return {
+            resultado = {
                 'success': True,
                 'alumno': alumno['nombre'],
                 'archivo': nombre_archivo,
                 'ruta': ruta_completa
             }
+            
+            # Carnet con nombre y grupo, reutilizando la imagen QR ya creada
+            if carnet:
+                with metricas.medir('generacion_segundos', operacion='carnet'):
+                    img_carnet = self.obtener_renderizador().renderizar(
+                        img.get_image(), alumno['nombre'], nivel, grado, seccion
+                    )
+                    nombre_carnet = f"{alumno['nombre'].replace(' ', '_')}_CARNET.png"
+                    ruta_carnet = os.path.join(carpeta, nombre_carnet)
+                    img_carnet.save(ruta_carnet, compress_level=1)
+                resultado['carnet'] = ruta_carnet
+            
+            metricas.incrementar('qr_generados_total', resultado='exitoso')
+            return resultado
         
         except Exception as e:
+            metricas.incrementar('qr_generados_total', resultado='fallido')
+            metricas.incrementar('errores_total', operacion='generar_qr_individual', tipo=type(e).__name__)
             return {
                 'success': False,
                 'error': str(e),
                 'alumno': alumno.get('nombre', 'Desconocido')
             }
+        
+        finally:
+            metricas.observar('generacion_segundos', time.perf_counter() - inicio, operacion='qr_individual')
     
-    def generar_codigos_qr(self, alumnos, nivel, grado, seccion):
+    def generar_codigos_qr(self, alumnos, nivel, grado, seccion, carnet=False):
         """Generar códigos QR para múltiples alumnos"""
         # Crear carpeta del grupo
-        self.crear_carpeta_grupo(nivel, grado, seccion)
+        carpeta = self.crear_carpeta_grupo(nivel, grado, seccion)
         
         resultados = {
             'success': True,
             'generados': [],
             'errores': [],
             'total': len(alumnos),
-            'carpeta': self.carpeta_actual
+            'carpeta': carpeta
         }
         
-        for alumno in alumnos:
-            resultado = self.generar_qr_individual(alumno, nivel, grado, seccion)
-            
-            if resultado['success']:
-                resultados['generados'].append(resultado)
-            else:
-                resultados['errores'].append(resultado)
+        with metricas.medir('generacion_segundos', operacion='qr_grupo'):
+            for alumno in alumnos:
+                resultado = self.generar_qr_individual(alumno, nivel, grado, seccion, carpeta, carnet)
+                
+                if resultado['success']:
+                    resultados['generados'].append(resultado)
+                else:
+                    resultados['errores'].append(resultado)
         
         if resultados['errores']:
             resultados['success'] = False
         
         return resultados
     
-    def crear_pdf_impresion(self, alumnos, nivel, grado, seccion):
-        """Crear PDF con códigos QR para imprimir (9 por página)"""
+    def crear_pdf_impresion(self, alumnos, nivel, grado, seccion, diseno=None):
+        """Crear PDF con códigos QR para imprimir (3x3 = 9 por página por defecto)"""
+        # ReportLab solo se carga cuando realmente se imprime
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        
+        # Un diseño inválido es un error del usuario (ValueError), no del PDF
+        columnas, filas = parsear_diseno(diseno)
+        
+        inicio = time.perf_counter()
         try:
-            # Crear carpeta del grupo
-            self.crear_carpeta_grupo(nivel, grado, seccion)
-            
             # Generar todos los QR primero
             resultado_qr = self.generar_codigos_qr(alumnos, nivel, grado, seccion)
             
@@ -122,54 +550,10 @@ class GeneradorQR:
             
             # Crear PDF en la carpeta del grupo
             nombre_pdf = f"{nivel}_{grado}_{seccion}.pdf"
-            ruta_pdf = os.path.join(self.carpeta_actual, nombre_pdf)
+            ruta_pdf = os.path.join(resultado_qr['carpeta'], nombre_pdf)
             
             c = canvas.Canvas(ruta_pdf, pagesize=A4)
-            ancho, alto = A4
-            
-            # Configuración de layout (3x3 = 9 QR por página)
-            qr_por_fila = 3
-            qr_por_columna = 3
-            qr_por_pagina = qr_por_fila * qr_por_columna
-            
-            margen = 40
-            espacio_x = (ancho - 2 * margen) / qr_por_fila
-            espacio_y = (alto - 2 * margen) / qr_por_columna
-            
-            qr_size = min(espacio_x, espacio_y) * 0.8
-            
-            # Iterar sobre los QR generados
-            for idx, qr_info in enumerate(resultado_qr['generados']):
-                # Nueva página si es necesario
-                if idx > 0 and idx % qr_por_pagina == 0:
-                    c.showPage()
-                
-                # Calcular posición
-                pos_en_pagina = idx % qr_por_pagina
-                fila = pos_en_pagina // qr_por_fila
-                columna = pos_en_pagina % qr_por_fila
-                
-                x = margen + columna * espacio_x + (espacio_x - qr_size) / 2
-                y = alto - margen - (fila + 1) * espacio_y + (espacio_y - qr_size) / 2
-                
-                # Dibujar imagen QR
-                c.drawImage(
-                    qr_info['ruta'],
-                    x, y,
-                    width=qr_size,
-                    height=qr_size
-                )
-                
-                # Agregar nombre del alumno debajo del QR
-                c.setFont("Helvetica", 8)
-                nombre = qr_info['alumno']
-                # Truncar nombre si es muy largo
-                if len(nombre) > 25:
-                    nombre = nombre[:22] + "..."
-                
-                texto_x = x + qr_size / 2
-                texto_y = y - 12
-                c.drawCentredString(texto_x, texto_y, nombre)
+            dibujar_qrs(c, resultado_qr['generados'], columnas, filas)
             
             # Guardar PDF
             c.save()
@@ -177,8 +561,110 @@ class GeneradorQR:
             return ruta_pdf
         
         except Exception as e:
+            metricas.incrementar('errores_total', operacion='crear_pdf_impresion', tipo=type(e).__name__)
             print(f"Error al crear PDF: {e}")
             return None
+        
+        finally:
+            metricas.observar('generacion_segundos', time.perf_counter() - inicio, operacion='pdf')
+    
+    def crear_pdf_colegio(self, grupos, diseno=None, procesos=None):
+        """Crear un solo PDF con todas las secciones del colegio.
+        
+        Cada sección (QR + páginas) se renderiza en un proceso aparte; luego
+        se unen en orden, con una página separadora y un marcador por sección.
+        grupos: lista de {'nivel', 'grado', 'seccion', 'alumnos'}
+        
+        El PDF completo se escribe en un archivo temporal (no se acumula en
+        qr_codes/); quien lo recibe en 'ruta' debe borrarlo después de usarlo.
+        """
+        inicio = time.perf_counter()
+        columnas, filas = parsear_diseno(diseno)
+        grupos = [g for g in grupos if g.get('alumnos')]
+        if not grupos:
+            return None
+        
+        try:
+            from pypdf import PdfWriter
+        except ImportError:
+            PdfWriter = None
+        
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+        descriptor, ruta_pdf = tempfile.mkstemp(prefix='qrasist_colegio_', suffix='.pdf')
+        os.close(descriptor)
+        
+        # Con pypdf cada proceso genera también el PDF de su sección;
+        # sin él, los procesos generan los QR y las páginas se dibujan aquí
+        carpeta_temporal = tempfile.mkdtemp(prefix='qrasist_colegio_')
+        rutas_secciones = [
+            os.path.join(carpeta_temporal, f"seccion_{i:03d}.pdf") if PdfWriter else None
+            for i in range(len(grupos))
+        ]
+        
+        procesos = procesos or min(len(grupos), os.cpu_count() or 1)
+        try:
+            if procesos > 1:
+                # 'spawn' en vez de fork: el servidor tiene hilos activos
+                # (bloqueos tomados) que no deben copiarse a los procesos
+                contexto = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+                    resultados = list(pool.map(
+                        renderizar_seccion, grupos, [(columnas, filas)] * len(grupos),
+                        [self.qr_dir] * len(grupos), rutas_secciones
+                    ))
+                
+                # Los QR se contaron en los procesos de trabajo: registrarlos aquí
+                for resultado in resultados:
+                    metricas.incrementar('qr_generados_total', len(resultado['generados']), resultado='exitoso')
+                    metricas.incrementar('qr_generados_total', len(resultado['errores']), resultado='fallido')
+            else:
+                resultados = [
+                    renderizar_seccion(grupo, (columnas, filas), self.qr_dir, ruta)
+                    for grupo, ruta in zip(grupos, rutas_secciones)
+                ]
+            
+            for resultado in resultados:
+                metricas.observar('generacion_segundos', resultado['duracion'], operacion='seccion')
+            
+            if PdfWriter:
+                writer = PdfWriter()
+                for grupo, resultado, ruta in zip(grupos, resultados, rutas_secciones):
+                    if resultado['generados']:
+                        writer.append(
+                            ruta,
+                            outline_item=titulo_grupo(grupo['nivel'], grupo['grado'], grupo['seccion']),
+                            import_outline=False
+                        )
+                with open(ruta_pdf, 'wb') as f:
+                    writer.write(f)
+            else:
+                from reportlab.lib.pagesizes import A4
+                from reportlab.pdfgen import canvas
+                
+                c = canvas.Canvas(ruta_pdf, pagesize=A4)
+                c.showOutline()
+                for grupo, resultado in zip(grupos, resultados):
+                    if resultado['generados']:
+                        dibujar_divisor(c, titulo_grupo(grupo['nivel'], grupo['grado'], grupo['seccion']), len(resultado['generados']))
+                        dibujar_qrs(c, resultado['generados'], columnas, filas)
+                c.save()
+        
+        except Exception:
+            os.remove(ruta_pdf)
+            raise
+        
+        finally:
+            shutil.rmtree(carpeta_temporal, ignore_errors=True)
+            metricas.observar('generacion_segundos', time.perf_counter() - inicio, operacion='pdf_colegio')
+        
+        return {
+            'success': all(r['success'] for r in resultados),
+            'ruta': ruta_pdf,
+            'nombre': f"Colegio_{marca}.pdf",
+            'secciones': len(grupos),
+            'generados': sum(len(r['generados']) for r in resultados),
+            'errores': [e for r in resultados for e in r['errores']]
+        }
     
     def validar_id(self, id_alumno):
         """Validar formato de ID"""
@@ -0,0 +1,265 @@
+"""
+Módulo de Índice de Registros
+Índice persistente de los archivos de asistencia (registros, fecha y
+estado de envío) validado por tamaño y fecha de modificación
+"""
+
+import os
+import json
+import threading
+import time
+from datetime import datetime
+
+from modules.metricas import metricas
+
+NOMBRE_INDICE = '.indice_registro.json'
+VERSION_INDICE = 2
+
+# Margen (segundos) para no confiar en el mtime de la carpeta cuando acaba
+# de cambiar; solo se aplica si el sistema de archivos guarda fechas en
+# segundos enteros (FAT, algunas unidades de red)
+MARGEN_MTIME_CARPETA = 2
+
+
+class IndiceRegistro:
+    """Índice de archivos asistencia_*.txt de una carpeta de registro"""
+
+    def __init__(self, registro_dir):
+        self.registro_dir = registro_dir
+        self.ruta_indice = os.path.join(registro_dir, NOMBRE_INDICE)
+        self.bloqueo = threading.Lock()
+        self.entradas = {}  # {nombre_archivo: datos del archivo}
+        self.mtime_carpeta = None
+        self.hora_escaneo = 0
+        self.dia_listado = None
+        self.modificado = False
+        self.cargar()
+
+    # ==================== PERSISTENCIA ====================
+
+    def cargar(self):
+        """Cargar el índice guardado en disco (si existe y es válido)"""
+        try:
+            with open(self.ruta_indice, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            if datos.get('version') == VERSION_INDICE:
+                self.entradas = datos.get('archivos', {})
+                for entrada in self.entradas.values():
+                    entrada['fecha_sort'] = datetime.strptime(entrada['fecha'], "%Y%m%d")
+        except (OSError, ValueError, KeyError):
+            self.entradas = {}
+
+    def guardar(self):
+        """Guardar el índice de forma atómica (archivo temporal + reemplazo)"""
+        if not self.modificado:
+            return False
+        ruta_temporal = self.ruta_indice + '.tmp'
+        try:
+            # fecha_sort (datetime) no se guarda: se reconstruye al cargar
+            archivos = {
+                nombre: {k: v for k, v in entrada.items() if k != 'fecha_sort'}
+                for nombre, entrada in self.entradas.items()
+            }
+            with open(ruta_temporal, 'w', encoding='utf-8') as f:
+                json.dump({'version': VERSION_INDICE, 'archivos': archivos}, f)
+            os.replace(ruta_temporal, self.ruta_indice)
+            self.modificado = False
+            return True
+        except OSError as e:
+            print(f"Error al guardar índice de registros: {e}")
+            return False
+
+    # ==================== ACTUALIZACIÓN ====================
+
+    def contar_lineas(self, ruta, entrada, stat):
+        """Contar líneas leyendo solo lo agregado desde la última vez"""
+        desde = 0
+        lineas = 0
+        termina_en_salto = True
+
+        # Los registros solo crecen por el final: si el archivo es más grande
+        # que antes, basta con leer los bytes nuevos
+        if entrada and stat.st_size >= entrada['tamano'] and entrada.get('termina_en_salto', True):
+            desde = entrada['tamano']
+            lineas = entrada['lineas']
+
+        with open(ruta, 'rb') as f:
+            f.seek(desde)
+            while True:
+                bloque = f.read(1024 * 1024)
+                if not bloque:
+                    break
+                lineas += bloque.count(b'\n')
+                termina_en_salto = bloque.endswith(b'\n')
+
+        if entrada and desde == stat.st_size:
+            termina_en_salto = entrada.get('termina_en_salto', True)
+
+        return lineas, termina_en_salto
+
+    def actualizar_archivo(self, nombre, stat, marca_stat):
+        """Revalidar un archivo; solo lo lee si cambió su tamaño o mtime"""
+        entrada = self.entradas.get(nombre)
+        ruta = os.path.join(self.registro_dir, nombre)
+
+        if entrada is None:
+            # Extraer fecha del nombre: asistencia_LAPTOP_A_20260113.txt; se
+            # interpreta una sola vez, al crear la entrada
+            fecha_str = nombre[:-len('.txt')].split('_')[-1]
+            fecha_sort = datetime.strptime(fecha_str, "%Y%m%d")
+            fecha = fecha_sort.strftime("%d/%m/%Y")
+        else:
+            fecha_str, fecha, fecha_sort = entrada['fecha'], entrada['fecha_mostrar'], entrada['fecha_sort']
+
+        if entrada is None or entrada['tamano'] != stat.st_size or entrada['mtime_ns'] != stat.st_mtime_ns:
+            try:
+                lineas, termina_en_salto = self.contar_lineas(ruta, entrada, stat)
+            except OSError:
+                lineas, termina_en_salto = 0, True
+            metricas.incrementar('indice_registro_lecturas_total', tipo='archivo')
+            nueva = {
+                'fecha': fecha_str,
+                'fecha_mostrar': fecha,
+                'fecha_sort': fecha_sort,
+                'tamano': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'lineas': lineas,
+                'termina_en_salto': termina_en_salto,
+                'envio': entrada.get('envio') if entrada else None
+            }
+            entrada = nueva
+            self.entradas[nombre] = entrada
+            self.modificado = True
+
+        # Marca .enviado: se lee solo si apareció o cambió
+        if marca_stat is None:
+            if entrada['envio'] is not None:
+                entrada['envio'] = None
+                self.modificado = True
+        elif entrada['envio'] is None or entrada['envio']['mtime_ns'] != marca_stat.st_mtime_ns:
+            try:
+                with open(ruta + '.enviado', 'r') as f:
+                    fecha_envio = f.read().strip()
+            except OSError:
+                fecha_envio = "Desconocida"
+            metricas.incrementar('indice_registro_lecturas_total', tipo='marca')
+            entrada['envio'] = {'mtime_ns': marca_stat.st_mtime_ns, 'fecha_envio': fecha_envio}
+            self.modificado = True
+
+    def _stat(self, ruta):
+        """os.stat que devuelve None si el archivo no existe"""
+        try:
+            return os.stat(ruta)
+        except OSError:
+            return None
+
+    def escanear(self):
+        """Recorrer la carpeta y revalidar todos los archivos por stat"""
+        inicio_escaneo = time.time()
+        self.mtime_carpeta = os.stat(self.registro_dir).st_mtime_ns
+        nombres = os.listdir(self.registro_dir)
+        marcas = set(n for n in nombres if n.endswith('.txt.enviado'))
+
+        vistos = set()
+        for nombre in nombres:
+            if not (nombre.startswith('asistencia_') and nombre.endswith('.txt')):
+                continue
+            stat = self._stat(os.path.join(self.registro_dir, nombre))
+            if stat is None:
+                continue
+            marca = nombre + '.enviado'
+            marca_stat = self._stat(os.path.join(self.registro_dir, marca)) if marca in marcas else None
+            try:
+                self.actualizar_archivo(nombre, stat, marca_stat)
+            except ValueError:
+                # Nombre con fecha inválida: se ignora igual que antes
+                continue
+            vistos.add(nombre)
+
+        # Quitar del índice los archivos que ya no existen
+        for nombre in list(self.entradas):
+            if nombre not in vistos:
+                del self.entradas[nombre]
+                self.modificado = True
+
+        self.hora_escaneo = inicio_escaneo
+        metricas.incrementar('indice_registro_escaneos_total')
+
+    def revalidar_dias(self, fechas):
+        """Revalidar solo los archivos de esas fechas (los únicos que crecen)"""
+        for nombre, entrada in list(self.entradas.items()):
+            if entrada['fecha'] not in fechas:
+                continue
+            ruta = os.path.join(self.registro_dir, nombre)
+            stat = self._stat(ruta)
+            if stat is None:
+                del self.entradas[nombre]
+                self.modificado = True
+                continue
+            self.actualizar_archivo(nombre, stat, self._stat(ruta + '.enviado'))
+
+    def invalidar(self, nombre):
+        """Forzar la revalidación de un archivo (o de todos, con None) en el próximo listado"""
+        with self.bloqueo:
+            self.mtime_carpeta = None
+            entrada = self.entradas.get(nombre)
+            if entrada is not None and entrada['envio'] is not None:
+                entrada['envio']['mtime_ns'] = None
+
+    # ==================== CONSULTA ====================
+
+    def listar(self):
+        """Listar los archivos de registro con el mismo formato que LectorQR"""
+        with self.bloqueo:
+            if not os.path.exists(self.registro_dir):
+                return []
+
+            hoy = datetime.now().strftime("%Y%m%d")
+            mtime_carpeta = os.stat(self.registro_dir).st_mtime_ns
+
+            # Si la carpeta no cambió (no hay archivos ni marcas nuevas), solo
+            # hace falta revisar los archivos de hoy y, si pasó la medianoche,
+            # los del día del último listado (pudieron crecer antes de cerrar);
+            # si no, se revalida todo por stat y únicamente se leen los
+            # archivos modificados
+            confiable = True
+            if mtime_carpeta % 1_000_000_000 == 0:
+                confiable = (mtime_carpeta / 1e9) < self.hora_escaneo - MARGEN_MTIME_CARPETA
+            if mtime_carpeta == self.mtime_carpeta and confiable:
+                self.revalidar_dias({hoy, self.dia_listado})
+            else:
+                self.escanear()
+
+                # Solo se guarda tras un recorrido completo: los archivos de
+                # hoy se revalidan en cada listado y no hace falta persistirlos.
+                # Guardar el índice cambia el mtime de la carpeta; si nada más
+                # la tocó desde el recorrido, se toma el mtime nuevo como base
+                antes = os.stat(self.registro_dir).st_mtime_ns
+                if self.guardar() and antes == self.mtime_carpeta:
+                    self.mtime_carpeta = os.stat(self.registro_dir).st_mtime_ns
+            self.dia_listado = hoy
+
+            archivos = []
+            for nombre, entrada in self.entradas.items():
+                # Determinar estado
+                if entrada['fecha'] == hoy:
+                    estado = "actual"
+                elif entrada['envio'] is not None:
+                    estado = "enviado"
+                else:
+                    estado = "pendiente"
+
+                archivos.append({
+                    'nombre': nombre,
+                    'ruta': os.path.join(self.registro_dir, nombre),
+                    'fecha': entrada['fecha_mostrar'],
+                    'fecha_sort': entrada['fecha_sort'],
+                    'registros': max(0, entrada['lineas'] + (0 if entrada['termina_en_salto'] else 1) - 1),
+                    'estado': estado,
+                    'fecha_envio': entrada['envio']['fecha_envio'] if estado == "enviado" else None
+                })
+
+        # Ordenar por fecha (más reciente primero)
+        archivos.sort(key=lambda x: x['fecha_sort'], reverse=True)
+
+        return archivos
@@ -5,8 +5,19 @@ Lógica para registrar asistencias y gestionar archivos
 
 import os
 import csv
+import io
+from collections import deque
 from datetime import datetime, timedelta
 import shutil
+import threading
+import time
+
+from modules.metricas import metricas
+from modules.indice_registro import IndiceRegistro
+from modules.archivador import ArchivadorRegistro
+
+# Registros recientes que se guardan en memoria para el panel del lector
+MAX_ULTIMOS_REGISTROS = 50
 
 class LectorQR:
     """Clase para gestionar la lectura de QR y registro de asistencias"""
@@ -20,6 +31,21 @@ class LectorQR:
         # Cache de últimos escaneos (para prevenir duplicados)
         self.ultimos_escaneos = {}  # {id_alumno: timestamp}
         
+        # Bloqueo compartido: el servidor atiende peticiones en varios hilos,
+        # así que la verificación de duplicados, la escritura del archivo y
+        # la actualización del cache deben ocurrir como una sola operación
+        self.bloqueo = threading.RLock()
+        
+        # Estadísticas del día en memoria (total y últimos registros), para
+        # que las consultas periódicas no lean el archivo ni tomen el bloqueo
+        self.estadisticas_hoy = None  # {'archivo', 'total', 'ultimos'}
+        
+        # Índice de archivos de registro (se crea al primer listado)
+        self.indice = None
+        
+        # Archivo mensual comprimido de días cerrados y ya enviados
+        self.archivador = None
+        
     def obtener_archivo_hoy(self):
         """Obtener el nombre del archivo de registro de hoy"""
         fecha_hoy = datetime.now().strftime("%Y%m%d")
@@ -62,165 +88,219 @@ class LectorQR:
     
     def registrar_asistencia(self, datos_qr):
         """Registrar asistencia de un alumno"""
+        inicio = time.perf_counter()
         try:
             # Parsear datos del QR
-            alumno = self.parsear_qr(datos_qr)
+            with metricas.medir('registro_etapa_segundos', etapa='parseo'):
+                alumno = self.parsear_qr(datos_qr)
             if not alumno:
+                metricas.incrementar('escaneos_total', resultado='invalido')
                 return {
                     'success': False,
                     'error': 'Código QR inválido'
                 }
             
-            # Verificar duplicados
-            es_duplicado, segundos_desde = self.verificar_duplicado(alumno['id'])
-            if es_duplicado:
-                minutos = segundos_desde // 60
-                segundos = segundos_desde % 60
+            metricas.sumar('registro_espera_bloqueo', 1)
+            inicio_espera = time.perf_counter()
+            with self.bloqueo:
+                metricas.sumar('registro_espera_bloqueo', -1)
+                metricas.observar('registro_etapa_segundos', time.perf_counter() - inicio_espera, etapa='espera')
+                
+                # Verificar duplicados
+                with metricas.medir('registro_etapa_segundos', etapa='duplicado'):
+                    es_duplicado, segundos_desde = self.verificar_duplicado(alumno['id'])
+                if es_duplicado:
+                    metricas.incrementar('escaneos_total', resultado='duplicado')
+                    minutos = segundos_desde // 60
+                    segundos = segundos_desde % 60
+                    return {
+                        'success': False,
+                        'duplicado': True,
+                        'alumno': alumno,
+                        'mensaje': f"Ya registrado hace {minutos} min {segundos} seg"
+                    }
+                
+                # Obtener archivo de hoy
+                archivo = self.obtener_archivo_hoy()
+                
+                # Crear archivo con cabecera si no existe
+                archivo_nuevo = not os.path.exists(archivo)
+                
+                # Registrar asistencia
+                ahora = datetime.now()
+                fecha = ahora.strftime("%Y-%m-%d")
+                hora = ahora.strftime("%H:%M:%S")
+                
+                with metricas.medir('registro_etapa_segundos', etapa='escritura'):
+                    with open(archivo, 'a', encoding='utf-8') as f:
+                        # Escribir cabecera si es archivo nuevo
+                        if archivo_nuevo:
+                            f.write("ID,NOMBRE_COMPLETO,NIVEL,GRADO,SECCION,FECHA,HORA,LAPTOP\n")
+                        
+                        # Escribir registro
+                        f.write(f"{alumno['id']},{alumno['nombre']},{alumno['nivel']},{alumno['grado']},{alumno['seccion']},{fecha},{hora},{self.laptop_id}\n")
+                
+                # Actualizar cache de últimos escaneos
+                self.ultimos_escaneos[alumno['id']] = ahora
+                
+                # Actualizar estadísticas del día (si ya están cargadas)
+                estadisticas = self.estadisticas_hoy
+                if estadisticas is not None and estadisticas['archivo'] == archivo:
+                    estadisticas['total'] += 1
+                    estadisticas['ultimos'].append({
+                        'ID': alumno['id'],
+                        'NOMBRE_COMPLETO': alumno['nombre'],
+                        'NIVEL': alumno['nivel'],
+                        'GRADO': alumno['grado'],
+                        'SECCION': alumno['seccion'],
+                        'FECHA': fecha,
+                        'HORA': hora,
+                        'LAPTOP': self.laptop_id
+                    })
+                metricas.incrementar('escaneos_total', resultado='registrado')
+                
                 return {
-                    'success': False,
-                    'duplicado': True,
+                    'success': True,
                     'alumno': alumno,
-                    'mensaje': f"Ya registrado hace {minutos} min {segundos} seg"
+                    'fecha': fecha,
+                    'hora': hora,
+                    'laptop': self.laptop_id
                 }
-            
-            # Obtener archivo de hoy
-            archivo = self.obtener_archivo_hoy()
-            
-            # Crear archivo con cabecera si no existe
-            archivo_nuevo = not os.path.exists(archivo)
-            
-            # Registrar asistencia
-            ahora = datetime.now()
-            fecha = ahora.strftime("%Y-%m-%d")
-            hora = ahora.strftime("%H:%M:%S")
-            
-            with open(archivo, 'a', encoding='utf-8') as f:
-                # Escribir cabecera si es archivo nuevo
-                if archivo_nuevo:
-                    f.write("ID,NOMBRE_COMPLETO,NIVEL,GRADO,SECCION,FECHA,HORA,LAPTOP\n")
-                
-                # Escribir registro
-                f.write(f"{alumno['id']},{alumno['nombre']},{alumno['nivel']},{alumno['grado']},{alumno['seccion']},{fecha},{hora},{self.laptop_id}\n")
-            
-            # Actualizar cache de últimos escaneos
-            self.ultimos_escaneos[alumno['id']] = ahora
-            
-            return {
-                'success': True,
-                'alumno': alumno,
-                'fecha': fecha,
-                'hora': hora,
-                'laptop': self.laptop_id
-            }
         
         except Exception as e:
+            metricas.incrementar('escaneos_total', resultado='error')
+            metricas.incrementar('errores_total', operacion='registrar_asistencia', tipo=type(e).__name__)
             return {
                 'success': False,
                 'error': str(e)
             }
+        
+        finally:
+            metricas.observar('registro_etapa_segundos', time.perf_counter() - inicio, etapa='total')
     
-    def contar_registros_hoy(self):
-        """Contar cuántos registros hay en el archivo de hoy"""
+    def obtener_estadisticas_hoy(self):
+        """Estadísticas del día; el archivo solo se lee la primera vez"""
         archivo = self.obtener_archivo_hoy()
+        estadisticas = self.estadisticas_hoy
+        if estadisticas is not None and estadisticas['archivo'] == archivo:
+            return estadisticas
         
-        if not os.path.exists(archivo):
-            return 0
-        
+        # Leer fuera del bloqueo; si mientras tanto se registró a alguien
+        # (cambió el tamaño), se vuelve a leer
+        while True:
+            total = 0
+            ultimos = deque(maxlen=MAX_ULTIMOS_REGISTROS)
+            leidos = 0
+            try:
+                with open(archivo, 'rb') as f:
+                    datos = f.read()
+                leidos = len(datos)
+                for fila in csv.DictReader(io.StringIO(datos.decode('utf-8'))):
+                    total += 1
+                    ultimos.append(fila)
+            except OSError:
+                pass
+            
+            with self.bloqueo:
+                tamano = os.path.getsize(archivo) if os.path.exists(archivo) else 0
+                if tamano == leidos:
+                    self.estadisticas_hoy = {'archivo': archivo, 'total': total, 'ultimos': ultimos}
+                    return self.estadisticas_hoy
+    
+    def contar_registros_hoy(self):
+        """Contar cuántos registros hay en el archivo de hoy"""
         try:
-            with open(archivo, 'r', encoding='utf-8') as f:
-                # Contar líneas menos la cabecera
-                lineas = f.readlines()
-                return max(0, len(lineas) - 1)
+            return self.obtener_estadisticas_hoy()['total']
         except:
             return 0
     
     def obtener_ultimos_registros(self, cantidad=5):
         """Obtener los últimos N registros"""
-        archivo = self.obtener_archivo_hoy()
-        
-        if not os.path.exists(archivo):
-            return []
-        
         try:
-            with open(archivo, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                registros = list(reader)
-                # Retornar los últimos N registros en orden inverso
-                return registros[-cantidad:][::-1]
+            ultimos = list(self.obtener_estadisticas_hoy()['ultimos'])
+            # Retornar los últimos N registros en orden inverso
+            return ultimos[-cantidad:][::-1]
         except:
             return []
     
-    def listar_archivos_registro(self):
-        """Listar todos los archivos de registro disponibles"""
-        archivos = []
+    def obtener_indice(self):
+        """Obtener el índice persistente de la carpeta de registro"""
+        with self.bloqueo:
+            if self.indice is None or self.indice.registro_dir != self.registro_dir:
+                self.indice = IndiceRegistro(self.registro_dir)
+            return self.indice
+    
+    def obtener_archivador(self):
+        """Obtener el archivador mensual de la carpeta de registro"""
+        with self.bloqueo:
+            if self.archivador is None or self.archivador.registro_dir != self.registro_dir:
+                self.archivador = ArchivadorRegistro(self.registro_dir)
+            return self.archivador
+    
+    def listar_archivos_registro(self, incluir_archivados=False):
+        """Listar los archivos de registro disponibles.
         
+        Los días archivados (ya enviados) solo se incluyen si se piden, para
+        que el listado de envío no crezca con los años
+        """
         if not os.path.exists(self.registro_dir):
-            return archivos
+            return []
         
-        for archivo in os.listdir(self.registro_dir):
-            if archivo.startswith('asistencia_') and archivo.endswith('.txt'):
-                ruta_completa = os.path.join(self.registro_dir, archivo)
-                ruta_enviado = ruta_completa + '.enviado'
-                
-                # Extraer fecha del nombre del archivo
-                # Formato: asistencia_LAPTOP_A_20260113.txt
-                try:
-                    partes = archivo.replace('.txt', '').split('_')
-                    fecha_str = partes[-1]  # 20260113
-                    fecha = datetime.strptime(fecha_str, "%Y%m%d")
-                    fecha_formateada = fecha.strftime("%d/%m/%Y")
-                    
-                    # Contar registros
-                    num_registros = 0
-                    try:
-                        with open(ruta_completa, 'r', encoding='utf-8') as f:
-                            num_registros = max(0, len(f.readlines()) - 1)
-                    except:
-                        pass
-                    
-                    # Determinar estado
-                    hoy = datetime.now().strftime("%Y%m%d")
-                    if fecha_str == hoy:
-                        estado = "actual"
-                    elif os.path.exists(ruta_enviado):
-                        estado = "enviado"
-                        # Leer fecha de envío
-                        try:
-                            with open(ruta_enviado, 'r') as f:
-                                fecha_envio = f.read().strip()
-                        except:
-                            fecha_envio = "Desconocida"
-                    else:
-                        estado = "pendiente"
-                        fecha_envio = None
-                    
-                    archivos.append({
-                        'nombre': archivo,
-                        'ruta': ruta_completa,
-                        'fecha': fecha_formateada,
-                        'fecha_sort': fecha,
-                        'registros': num_registros,
-                        'estado': estado,
-                        'fecha_envio': fecha_envio if estado == "enviado" else None
-                    })
-                except:
-                    continue
+        # El índice solo vuelve a leer los archivos que cambiaron
+        archivos = self.obtener_indice().listar()
+        if incluir_archivados:
+            archivos.extend(self.obtener_archivador().listar())
         
         # Ordenar por fecha (más reciente primero)
         archivos.sort(key=lambda x: x['fecha_sort'], reverse=True)
         
         return archivos
     
+    def registros_alumno(self, id_alumno):
+        """Todas las asistencias de un alumno (archivadas y vivas)"""
+        registros = self.obtener_archivador().registros_alumno(id_alumno)
+        
+        for archivo in sorted(os.listdir(self.registro_dir)):
+            if archivo.startswith('asistencia_') and archivo.endswith('.txt'):
+                with open(os.path.join(self.registro_dir, archivo), 'r', encoding='utf-8') as f:
+                    registros.extend(fila for fila in csv.DictReader(f) if fila.get('ID') == id_alumno)
+        
+        return registros
+    
+    def archivar_registros(self, dias_minimos=7):
+        """Compactar en segmentos mensuales los archivos enviados de días cerrados"""
+        resultado = self.obtener_archivador().archivar(dias_minimos)
+        
+        if resultado['archivados'] and self.indice is not None:
+            self.indice.invalidar(None)
+        
+        return resultado
+    
     def enviar_archivo(self, nombre_archivo, carpeta_destino):
         """Enviar un archivo a la carpeta compartida"""
+        with metricas.medir('transferencia_segundos'):
+            resultado = self._copiar_archivo(nombre_archivo, carpeta_destino)
+        
+        metricas.incrementar(
+            'transferencias_total',
+            resultado='exitoso' if resultado['success'] else 'fallido'
+        )
+        return resultado
+    
+    def _copiar_archivo(self, nombre_archivo, carpeta_destino):
+        """Copiar el archivo a la carpeta compartida y marcarlo como enviado"""
         try:
             ruta_origen = os.path.join(self.registro_dir, nombre_archivo)
             
+            # Un archivo ya archivado se reenvía desde su segmento mensual
+            contenido_archivado = None
             if not os.path.exists(ruta_origen):
-                return {
-                    'success': False,
-                    'error': 'Archivo no encontrado'
-                }
+                contenido_archivado = self.obtener_archivador().leer(nombre_archivo)
+                if contenido_archivado is None:
+                    return {
+                        'success': False,
+                        'error': 'Archivo no encontrado'
+                    }
             
             # Verificar si carpeta destino existe
             if not os.path.exists(carpeta_destino):
@@ -229,6 +309,17 @@ class LectorQR:
                     'error': 'Carpeta de red no disponible'
                 }
             
+            if contenido_archivado is not None:
+                # Bytes tal cual (como shutil.copy2): en modo texto Windows
+                # agregaría otro \r a las líneas que ya terminan en \r\n
+                ruta_destino = os.path.join(carpeta_destino, nombre_archivo)
+                with open(ruta_destino, 'wb') as f:
+                    f.write(contenido_archivado)
+                return {
+                    'success': True,
+                    'archivo': nombre_archivo
+                }
+            
             # Copiar archivo
             ruta_destino = os.path.join(carpeta_destino, nombre_archivo)
             shutil.copy2(ruta_origen, ruta_destino)
@@ -238,12 +329,16 @@ class LectorQR:
             with open(archivo_marca, 'w') as f:
                 f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             
+            if self.indice is not None:
+                self.indice.invalidar(nombre_archivo)
+            
             return {
                 'success': True,
                 'archivo': nombre_archivo
             }
         
         except Exception as e:
+            metricas.incrementar('errores_total', operacion='enviar_archivo', tipo=type(e).__name__)
             return {
                 'success': False,
                 'error': str(e)
@@ -256,8 +351,12 @@ class LectorQR:
             'fallidos': []
         }
         
+        # Cola de envío visible en /metrics mientras dura la transferencia
+        metricas.sumar('transferencias_pendientes', len(nombres_archivos))
+        
         for nombre in nombres_archivos:
             resultado = self.enviar_archivo(nombre, carpeta_destino)
+            metricas.sumar('transferencias_pendientes', -1)
             
             if resultado['success']:
                 resultados['exitosos'].append(nombre)
@@ -0,0 +1,179 @@
+"""
+Módulo de Métricas
+Contadores, indicadores e histogramas de latencia en memoria,
+exportados en formato de texto compatible con Prometheus
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites de los histogramas de latencia (en segundos)
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metricas:
+    """Registro de métricas seguro entre hilos y de bajo costo"""
+
+    def __init__(self, prefijo="qrasist"):
+        self.prefijo = prefijo
+        self.bloqueo = threading.Lock()
+        self.descripciones = {}  # {nombre: (tipo, ayuda)}
+        self.contadores = {}  # {(nombre, etiquetas): valor}
+        self.indicadores = {}  # {(nombre, etiquetas): valor}
+        self.histogramas = {}  # {(nombre, etiquetas): [conteos_por_bucket, suma, total]}
+        self.inicio = time.time()
+
+    def _clave(self, nombre, etiquetas):
+        """Clave interna: nombre completo + etiquetas ordenadas"""
+        etiquetas = tuple(sorted(etiquetas.items())) if etiquetas else ()
+        return (f"{self.prefijo}_{nombre}", etiquetas)
+
+    def describir(self, nombre, tipo, ayuda):
+        """Registrar tipo y descripción de una métrica"""
+        self.descripciones[f"{self.prefijo}_{nombre}"] = (tipo, ayuda)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        """Incrementar un contador"""
+        clave = self._clave(nombre, etiquetas)
+        with self.bloqueo:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre, valor, **etiquetas):
+        """Fijar el valor de un indicador"""
+        clave = self._clave(nombre, etiquetas)
+        with self.bloqueo:
+            self.indicadores[clave] = valor
+
+    def sumar(self, nombre, valor, **etiquetas):
+        """Sumar (o restar) al valor de un indicador"""
+        clave = self._clave(nombre, etiquetas)
+        with self.bloqueo:
+            self.indicadores[clave] = self.indicadores.get(clave, 0) + valor
+
+    def observar(self, nombre, segundos, **etiquetas):
+        """Agregar una observación a un histograma de latencia"""
+        clave = self._clave(nombre, etiquetas)
+        with self.bloqueo:
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = [[0] * len(BUCKETS_LATENCIA), 0.0, 0]
+                self.histogramas[clave] = histograma
+
+            for i, limite in enumerate(BUCKETS_LATENCIA):
+                if segundos <= limite:
+                    histograma[0][i] += 1
+                    break
+            histograma[1] += segundos
+            histograma[2] += 1
+
+    @contextmanager
+    def medir(self, nombre, **etiquetas):
+        """Medir la duración de un bloque y registrarla en un histograma"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def reiniciar(self):
+        """Borrar todos los valores registrados"""
+        with self.bloqueo:
+            self.contadores.clear()
+            self.indicadores.clear()
+            self.histogramas.clear()
+            self.inicio = time.time()
+
+    def _formatear_etiquetas(self, etiquetas, extra=None):
+        """Convertir etiquetas al formato {clave="valor",...}"""
+        pares = list(etiquetas)
+        if extra:
+            pares.append(extra)
+        if not pares:
+            return ""
+        texto = ",".join(f'{k}="{self._escapar(v)}"' for k, v in pares)
+        return "{" + texto + "}"
+
+    def _escapar(self, valor):
+        """Escapar barras, comillas y saltos de línea en valores de etiquetas"""
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _formatear_numero(self, valor):
+        """Formatear números sin decimales innecesarios"""
+        if isinstance(valor, float) and not valor.is_integer():
+            return repr(valor)
+        return str(int(valor))
+
+    def exportar_prometheus(self):
+        """Exportar todas las métricas en formato de texto de Prometheus"""
+        with self.bloqueo:
+            contadores = dict(self.contadores)
+            indicadores = dict(self.indicadores)
+            histogramas = {k: (list(v[0]), v[1], v[2]) for k, v in self.histogramas.items()}
+            inicio = self.inicio
+
+        lineas = []
+
+        def cabecera(nombre, tipo_defecto):
+            tipo, ayuda = self.descripciones.get(nombre, (tipo_defecto, None))
+            if ayuda:
+                lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+        def agrupar(valores):
+            grupos = {}
+            for (nombre, etiquetas), valor in sorted(valores.items()):
+                grupos.setdefault(nombre, []).append((etiquetas, valor))
+            return grupos
+
+        for nombre, series in agrupar(contadores).items():
+            cabecera(nombre, "counter")
+            for etiquetas, valor in series:
+                lineas.append(f"{nombre}{self._formatear_etiquetas(etiquetas)} {self._formatear_numero(valor)}")
+
+        for nombre, series in agrupar(indicadores).items():
+            cabecera(nombre, "gauge")
+            for etiquetas, valor in series:
+                lineas.append(f"{nombre}{self._formatear_etiquetas(etiquetas)} {self._formatear_numero(valor)}")
+
+        for nombre, series in agrupar(histogramas).items():
+            cabecera(nombre, "histogram")
+            for etiquetas, (conteos, suma, total) in series:
+                acumulado = 0
+                for limite, conteo in zip(BUCKETS_LATENCIA, conteos):
+                    acumulado += conteo
+                    le = self._formatear_etiquetas(etiquetas, ("le", repr(limite)))
+                    lineas.append(f"{nombre}_bucket{le} {acumulado}")
+                le = self._formatear_etiquetas(etiquetas, ("le", "+Inf"))
+                lineas.append(f"{nombre}_bucket{le} {total}")
+                lineas.append(f"{nombre}_sum{self._formatear_etiquetas(etiquetas)} {suma!r}")
+                lineas.append(f"{nombre}_count{self._formatear_etiquetas(etiquetas)} {total}")
+
+        nombre = f"{self.prefijo}_tiempo_activo_segundos"
+        lineas.append(f"# TYPE {nombre} gauge")
+        lineas.append(f"{nombre} {time.time() - inicio:.3f}")
+
+        return "\n".join(lineas) + "\n"
+
+
+# Registro global compartido por todos los módulos
+metricas = Metricas()
+
+metricas.describir("arranque_carga_segundos", "gauge", "Tiempo de carga de main.py hasta tener la aplicación lista (sin el intérprete)")
+metricas.describir("http_peticion_segundos", "histogram", "Latencia de las peticiones HTTP por endpoint")
+metricas.describir("http_respuestas_total", "counter", "Respuestas HTTP por endpoint y código de estado")
+metricas.describir("http_peticiones_en_curso", "gauge", "Peticiones HTTP que se están atendiendo")
+metricas.describir("registro_etapa_segundos", "histogram", "Latencia de cada etapa del registro de asistencia")
+metricas.describir("registro_espera_bloqueo", "gauge", "Registros esperando el bloqueo del lector")
+metricas.describir("escaneos_total", "counter", "Códigos QR recibidos por resultado")
+metricas.describir("generacion_segundos", "histogram", "Latencia de la generación de QR y PDF por operación")
+metricas.describir("qr_generados_total", "counter", "Códigos QR generados por resultado")
+metricas.describir("transferencia_segundos", "histogram", "Latencia del envío de archivos a la PC central")
+metricas.describir("transferencias_total", "counter", "Archivos enviados a la PC central por resultado")
+metricas.describir("transferencias_pendientes", "gauge", "Archivos en cola de envío a la PC central")
+metricas.describir("indice_registro_escaneos_total", "counter", "Recorridos completos de la carpeta de registro")
+metricas.describir("indice_registro_lecturas_total", "counter", "Archivos de registro o marcas .enviado leídos por el índice")
+metricas.describir("descargas_zip_total", "counter", "Descargas ZIP de códigos QR completadas")
+metricas.describir("descargas_zip_archivos_total", "counter", "Imágenes QR enviadas en descargas ZIP")
+metricas.describir("archivo_indices_reconstruidos_total", "counter", "Índices mensuales de archivo reconstruidos desde su segmento")
+metricas.describir("errores_total", "counter", "Excepciones capturadas por operación")